@@ -1,80 +1,52 @@
-import sys
 # RANDOM MOVE AI (1st Model)
+import os
 import random
-
-pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}  # Dictionary assigns value to each respective piece type
-
-#  knight is generally better in centre than corners
-#  helping AI develop positional awareness
-
-knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 1, 1, 1, 1, 1, 1, 1]]
-
-BishopScores = [[0, 2, 2, 2, 2, 2, 2, 0],
-                [2, 4, 4, 4, 4, 4, 4, 2],
-                [2, 4, 5, 6, 6, 5, 4, 2],
-                [2, 5, 5, 6, 6, 5, 5, 2],
-                [2, 4, 6, 6, 6, 6, 4, 2],
-                [2, 6, 6, 6, 6, 6, 6, 2],
-                [2, 5, 4, 4, 4, 4, 5, 2],
-                [0, 2, 2, 2, 2, 2, 2, 0]]
-
-RookScores = [[2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5],
-              [5, 7.5, 7.5, 7.5, 7.5, 7.5, 7.5, 5],
-              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
-              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
-              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
-              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
-              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
-              [4, 2.5, 2.5, 5, 5, 2.5, 2.5, 4]]
-
-QueenScores = [[0, 2, 2, 3, 3, 2, 2, 0],
-               [2, 4, 4, 4, 4, 4, 4, 2],
-               [2, 4, 5, 5, 5, 5, 4, 2],
-               [3, 4, 5, 5, 5, 5, 4, 3],
-               [4, 4, 5, 5, 5, 5, 4, 3],
-               [2, 5, 5, 5, 5, 5, 4, 2],
-               [2, 4, 5, 4, 4, 4, 4, 2],
-               [0, 2, 2, 3, 3, 2, 2, 0]]
-
-PawnScores = [[8, 8, 8, 8, 8, 8, 8, 8],
-              [7, 7, 7, 7, 7, 7, 7, 7],
-              [3, 3, 4, 5, 5, 4, 3, 3],
-              [2.5, 2.5, 3, 4.5, 4.5, 3, 2.5, 2.5],
-              [2, 2, 2, 4, 4, 2, 2, 2],
-              [2.5, 1.5, 1, 2, 2, 1, 1.5, 2.5],
-              [2.5, 3, 3, 0, 0, 3, 3, 2.5],
-              [2, 2, 2, 2, 2, 2, 2, 2]]
-
-# [::-1] go through list in reverse order (used for scores from black's perspective
-piecePositionScores = {"wN": knightScores, "bN": knightScores[::-1], "wB": BishopScores, "bB": BishopScores[::-1],
-                       "wQ": QueenScores, "bQ": QueenScores[::-1], "wR": RookScores, "bR": RookScores[::-1],
-                       "wP": PawnScores, "bP": PawnScores[::-1]}
+import time
+from Chess.TranspositionTable import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+from Chess.Evaluation import pieceScore, evalScale
+from Chess.OpeningBook import OpeningBook
+from Chess.Bitbases import Bitbases
 
 CHECKMATE = 1000  # best possible scenario
 STALEMATE = 0  # better than losing position but worse than winning position
-EasyDepthUI = 0
-# Check if command-line arguments are provided
-if len(sys.argv) > 1:
-    # the first argument is playerOne and the second is playerTwo
-    playerOne = int(sys.argv[1])
-    playerTwo = int(sys.argv[2])
-    EasyDepthUI = str(sys.argv[3])
-    HighlightSquaresUI = int(sys.argv[4])
-    soundEffects = int(sys.argv[5])
-    BoardColour = int(sys.argv[6])
-
-if EasyDepthUI == "ON":
-    maxDepth = 1
-else:
-    maxDepth = 3
-# Check if command-line arguments are provided
+searchDepth = 0  # depth of the iteration being searched, NegaMaxAlphaBeta is at the root when depth == searchDepth
+searchDeadline = 0
+rootPieceCount = 32  # pieces on the board at the root of the current search
+stopEvent = None  # multiprocessing.Event set by the engine worker's owner to stop the current search early
+nodesSearched = 0
+depthReached = 0  # deepest finished iteration of the last search
+
+# Move ordering: the earlier a good move is searched, the sooner alpha-beta can cut off the rest
+# attacker values for MVV-LVA (most valuable victim, least valuable attacker), the king is the worst piece to capture
+# with since it can only take undefended pieces
+attackerOrderValue = {"P": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 10}
+maxPly = 64
+killerMoves = [[None, None] for _ in range(maxPly)]  # moveIDs of the last two quiet moves that caused a cutoff per ply
+historyScores = {colour + pieceType: [0] * 64 for colour in "wb" for pieceType in "PNBRQK"}  # [piece][end square]
+deltaMargin = 2  # positional swing allowed on top of the captured piece's value before delta pruning skips a capture
+historyLimit = 1 << 20  # history scores are halved when one reaches this, so they stay below the killer scores
+maxDepth = 3  # depth of the fixed depth searches (MinMax, NegaMax)
+depthLimit = 32  # deepest iteration the iterative deepening search may start
+
+timeLimit = 3  # seconds the iterative deepening search may think for each move
+pondering = True  # think on the human's time in Player Vs. AI games
+ponderTimeLimit = 600  # a ponder search runs until the human moves, this only bounds a forgotten one
+searchProcesses = os.cpu_count() or 1  # processes used by the root-parallel search
+ttSizeMB = 16  # memory given to the transposition table, it does not grow during a game
+transpositionTable = TranspositionTable(ttSizeMB)
+# Polyglot book next to this file, only opened (mapped, not read) the first time a position is looked up
+bookPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+openingBook = OpeningBook(bookPath)
+bitbases = Bitbases()  # KQK, KRK and KPK tables written by python -m Chess.Bitbases, mapped on the first probe
+bitbaseWin = CHECKMATE / 2  # score of a won bitbase position, below any mate the search has actually found
+
+
+# the easy AI of the menu only searches one move deep, ChessMain calls this with its command line setting
+def setEasyMode(easy):
+    global maxDepth, depthLimit
+    maxDepth, depthLimit = (1, 1) if easy else (3, 32)
+
+
 '''Picks and returns a random move'''
 
 
@@ -132,12 +104,74 @@ def initialiseNegaMax(gs, validMoves):  # helper method that calls initial recur
     return nextMove
 
 
-def initialiseNegaMaxAlphaBeta(gs, validMoves, returnQueue):  # helper method that calls initial recursive call
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves)
-    NegaMaxAlphaBeta(gs, validMoves, maxDepth, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    returnQueue.put(nextMove)
+class SearchTimeout(Exception):
+    """Raised inside NegaMaxAlphaBeta when the time limit of the current move runs out"""
+    pass
+
+
+def searchTimeUp():
+    return time.time() > searchDeadline or (stopEvent is not None and stopEvent.is_set())
+
+
+# Iterative deepening: search depth 1, 2, 3... until the time runs out and keep the move of the last finished depth.
+# Every finished depth fills the transposition table, so the next depth starts with the best moves ordered first.
+# Returns (depth, score, best move) for every finished depth, the score is from the side to move's point of view
+def iterativeDeepening(gs, validMoves, timeLimit, depthLimit, onDepth=None):
+    global nextMove, searchDepth, searchDeadline, nodesSearched, depthReached, rootPieceCount
+    searchDeadline = time.time() + timeLimit
+    rootPieceCount = gs.pieceCount
+    nodesSearched = 0
+    depthReached = 0
+    transpositionTable.newSearch()
+    for killers in killerMoves:  # killers belong to plies of the previous search, which are now two plies off
+        killers[0] = killers[1] = None
+    ageHistoryScores()
+    results = []
+    movesMade = len(gs.moveLog)
+    for depth in range(1, depthLimit + 1):
+        searchDepth = depth
+        nextMove = None
+        try:
+            score = NegaMaxAlphaBeta(gs, validMoves, depth, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
+        except SearchTimeout:
+            while len(gs.moveLog) > movesMade:  # take back the moves of the unfinished search
+                gs.undoMove()
+            break
+        results.append((depth, score, nextMove))
+        depthReached = depth
+        if onDepth is not None:  # lets a front end report each finished depth as it happens
+            onDepth(depth, score, nextMove)
+        if abs(score) >= CHECKMATE or searchTimeUp():  # a forced mate will not change with depth
+            break
+    return results
+
+
+# the reply the opponent is expected to play to move: the best move the transposition table holds for the position
+# after it, or None when that position was not stored
+def expectedReply(gs, move):
+    gs.makeMove(move)
+    entry = transpositionTable.probe(gs.zobristKey)
+    gs.undoMove()
+    return entry[4] if entry else None
+
+
+# Root-parallel search (EngineWorker): the root moves are dealt out across processes and every process runs iterative
+# deepening on its share, so a fixed depth is reached roughly processes times sooner.
+# compares the (depth, score, moveID) results of every share of the root moves at the deepest depth all of them
+# finished and returns (that depth, best moveID). A share that stopped on a forced mate (for or against it) is done
+# with deepening, so its last result stands for every deeper depth instead of holding the others back
+def pickParallelResult(shareResults):
+    shareResults = [results for results in shareResults if results]  # shares that were given no moves
+    if not shareResults:
+        return 0, None
+    unproven = [len(results) for results in shareResults if abs(results[-1][1]) < CHECKMATE]
+    depth = min(unproven) if unproven else max(len(results) for results in shareResults)
+    bestScore, bestMoveID = -CHECKMATE - 1, None
+    for results in shareResults:
+        _, score, moveID = results[min(depth, len(results)) - 1]
+        if moveID is not None and score > bestScore:
+            bestScore, bestMoveID = score, moveID
+    return depth, bestMoveID
 
 
 def MinMax(gs, validMoves, depth, BoolwhiteToMove):  # recursive algorithm
@@ -193,29 +227,218 @@ def NegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta,
                      turnMultiplier):  # always look for max but negate on blacks turn
     # alpha is upper bound
     # beta is lower bound
-    global nextMove
+    # validMoves is None below the root, each node generates its own moves after the transposition table lookup
+    # so positions found in the table (including leaves) skip move generation
+    global nextMove, nodesSearched
+    nodesSearched += 1
+    if nodesSearched & 255 == 0 and searchDepth > 1 and searchTimeUp():  # depth 1 always finishes
+        raise SearchTimeout()
+    if depth != searchDepth:  # a repeated position depends on the path here, so it is checked before the table
+        gs.updateDrawRules()
+        if gs.threeMoveDrawRule or gs.fiftyMoveDrawRule:
+            return STALEMATE
+        if gs.pieceCount <= 3:  # perfect win/draw answer from the endgame tables
+            result = bitbases.probe(gs)
+            # a won ending is searched on when the game is already in it, so the search can find the mate
+            if result == 0 or (result is not None and (depth == 0 or rootPieceCount > 3)):
+                if result < 0 and not gs.getValidMoves():  # the table only says lost, a mate scores as one
+                    return -CHECKMATE
+                return result * (bitbaseWin + winProgress(gs)) if result else STALEMATE
+    key = gs.zobristKey
+    alphaOriginal = alpha
+    ttMoveID = None
+    entry = transpositionTable.probe(key)
+    if entry is not None:
+        ttMoveID = entry[4]
+        if entry[1] >= depth and depth != searchDepth:  # never cut off at the root, it has to pick a move
+            ttScore, ttFlag = entry[2], entry[3]
+            if ttFlag == EXACT:
+                return ttScore
+            elif ttFlag == LOWERBOUND:
+                alpha = max(alpha, ttScore)
+            elif ttFlag == UPPERBOUND:
+                beta = min(beta, ttScore)
+            if alpha >= beta:
+                return ttScore
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
+        score = quiescenceSearch(gs, alpha, beta, turnMultiplier)
+        if score <= alphaOriginal:
+            ttFlag = UPPERBOUND
+        elif score >= beta:
+            ttFlag = LOWERBOUND
+        else:
+            ttFlag = EXACT
+        transpositionTable.store(key, 0, score, ttFlag, None)
+        return score
     # move ordering best-first
+    ply = searchDepth - depth
+    if validMoves is None:
+        validMoves = stagedMoves(gs, ttMoveID, ply)
+    else:
+        orderMoves(validMoves, ttMoveID, ply)
     maxScore = -CHECKMATE
+    bestMoveID = None
     for move in validMoves:
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -1 * NegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
-        if score > maxScore:  # find updated Max
+        score = -1 * NegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier)
+        if score > maxScore or bestMoveID is None:  # find updated Max, a move is kept even when all of them get mated
             maxScore = score
-            if depth == maxDepth:
+            bestMoveID = move.moveID
+            if depth == searchDepth:
                 nextMove = move
         gs.undoMove()
         if maxScore > alpha:  # pruning
             alpha = maxScore
         if alpha >= beta:
+            if move.pieceCaptured == "--" and not move.isPawnPromotion:  # remember quiet moves that cut off
+                updateKillersAndHistory(move, depth, ply)
             break
     if gs.staleMate or gs.threeMoveDrawRule or gs.fiftyMoveDrawRule:
         maxScore = 0
+    if maxScore <= alphaOriginal:
+        ttFlag = UPPERBOUND
+    elif maxScore >= beta:
+        ttFlag = LOWERBOUND
+    else:
+        ttFlag = EXACT
+    transpositionTable.store(key, depth, maxScore, ttFlag, bestMoveID)
     return maxScore
 
 
+# how far a won bitbase position has got, so the search makes progress instead of shuffling between equally won
+# positions: material (a pawn advancing, then promoting) plus the losing king driven to the edge and the winning king
+# close to it
+def winProgress(gs):
+    if gs.evaluation > 0:  # only the winning side has material
+        strongKing, weakKing = gs.whiteKingLocation, gs.blackKingLocation
+    else:
+        strongKing, weakKing = gs.blackKingLocation, gs.whiteKingLocation
+    centreDistance = max(3 - weakKing[0], weakKing[0] - 4) + max(3 - weakKing[1], weakKing[1] - 4)
+    kingDistance = max(abs(strongKing[0] - weakKing[0]), abs(strongKing[1] - weakKing[1]))
+    return abs(gs.evaluation) / evalScale + 0.1 * centreDistance + 0.05 * (7 - kingDistance)
+
+
+# Quiescence search: instead of scoring a leaf in the middle of an exchange, keep searching captures until the position
+# is quiet. The side to move may also "stand pat" on the static score, since it does not have to capture
+def quiescenceSearch(gs, alpha, beta, turnMultiplier):
+    global nodesSearched
+    nodesSearched += 1
+    if nodesSearched & 255 == 0 and searchDepth > 1 and searchTimeUp():
+        raise SearchTimeout()
+    captures = gs.getCaptureMoves()  # every legal move when in check
+    inCheck = gs.inCheck
+    if inCheck:
+        if len(captures) == 0:
+            return -CHECKMATE
+        standPat = maxScore = -CHECKMATE  # no standing pat in check, an evasion has to be played
+    else:
+        standPat = maxScore = turnMultiplier * scoreBoard(gs)
+        if standPat >= beta:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+    orderMoves(captures, None, maxPly)
+    for move in captures:
+        # delta pruning: skip captures that cannot raise alpha even when the captured piece comes for free
+        if not inCheck and not move.isPawnPromotion and (
+                standPat + pieceScore[move.pieceCaptured[1]] + deltaMargin < alpha):
+            continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turnMultiplier)
+        gs.undoMove()
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
+        if alpha >= beta:
+            break
+    return maxScore
+
+
+# Staged move generation below the root: the transposition table move, then the captures by MVV-LVA, then the
+# killer moves of this ply, then the remaining quiet moves by history. Each stage is only generated once the moves
+# before it failed to cut off, and the table and killer moves are checked for legality on their own
+def stagedMoves(gs, ttMoveID, ply):
+    pinsAndChecks = gs.checkForPinsAndChecks()  # found once here, the search below the node overwrites gs.pins
+    triedIDs = set()
+    if ttMoveID is not None:
+        move = gs.getMoveFromID(ttMoveID, pinsAndChecks)
+        if move is not None:
+            triedIDs.add(ttMoveID)
+            yield move
+    captures = gs.getCaptureMoves(pinsAndChecks)  # every legal move when in check
+    orderMoves(captures, None, ply)
+    for move in captures:
+        if move.moveID not in triedIDs:
+            triedIDs.add(move.moveID)
+            yield move
+    if pinsAndChecks[0]:  # in check, the capture stage already held every evasion
+        return
+    for killerID in (killerMoves[ply] if ply < maxPly else ()):
+        if killerID is not None and killerID not in triedIDs:
+            move = gs.getMoveFromID(killerID, pinsAndChecks)
+            if move is not None and move.pieceCaptured == "--":
+                triedIDs.add(killerID)
+                yield move
+    quietMoves = [move for move in gs.getQuietMoves(pinsAndChecks) if move.moveID not in triedIDs]
+    if not triedIDs and not quietMoves:  # no legal move without being in check
+        gs.staleMate = True
+    orderMoves(quietMoves, None, ply)
+    yield from quietMoves
+
+
+# sorts moves best-first: the transposition table move, then captures and promotions by MVV-LVA, then the two killer
+# moves of this ply, then the remaining quiet moves by history score
+def orderMoves(moves, ttMoveID, ply):
+    killers = killerMoves[ply] if ply < maxPly else (None, None)
+
+    def moveOrderScore(move):
+        if move.moveID == ttMoveID:
+            return 1 << 30
+        if move.pieceCaptured != "--" or move.isPawnPromotion:
+            score = (1 << 24) - attackerOrderValue[move.pieceMoved[1]]
+            if move.pieceCaptured != "--":
+                score += 16 * pieceScore[move.pieceCaptured[1]]
+            if move.isPawnPromotion:
+                score += 16 * pieceScore["Q"]
+            return score
+        if move.moveID == killers[0]:
+            return (1 << 22) + 1
+        if move.moveID == killers[1]:
+            return 1 << 22
+        return historyScores[move.pieceMoved][move.endRow * 8 + move.endCol]
+
+    moves.sort(key=moveOrderScore, reverse=True)  # stable, so equal moves keep their shuffled order
+
+
+def updateKillersAndHistory(move, depth, ply):
+    if ply < maxPly:
+        killers = killerMoves[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+    history = historyScores[move.pieceMoved]
+    square = move.endRow * 8 + move.endCol
+    history[square] += depth * depth  # cutoffs near the root say more than cutoffs near the leaves
+    if history[square] >= historyLimit:
+        ageHistoryScores()
+
+
+def ageHistoryScores():  # halve every history score so old cutoffs slowly stop counting
+    for history in historyScores.values():
+        for square in range(64):
+            history[square] //= 2
+
+
+# forgets what the searches of the previous game learned: the transposition table, killer moves and history scores
+def newGame():
+    transpositionTable.clear()
+    for killers in killerMoves:
+        killers[0] = killers[1] = None
+    for history in historyScores.values():
+        history[:] = [0] * 64
+
+
 '''
 Positive is good for white, negative is good for black
 '''
@@ -230,21 +453,8 @@ def scoreBoard(gs):
     elif gs.staleMate or gs.fiftyMoveDrawRule or gs.threeMoveDrawRule:
         return STALEMATE
 
-    score = 0
-    weight = 0.1
-    for r in range(len(gs.board)):
-        for c in range(len(gs.board[r])):
-            square = gs.board[r][c]
-            if square != "--":  # check that there is a piece
-                # score positionally
-                piecePositionScore = 0
-                if square[1] != "K":
-                    piecePositionScore = piecePositionScores[square][r][c]  # return number in Score tables
-                if square[0] == "w":
-                    score += (pieceScore[square[1]] + (piecePositionScore * weight))
-                elif square[0] == "b":
-                    score -= (pieceScore[square[1]] + (piecePositionScore * weight))
-    return score
+    # material and piece-square score kept up to date by makeMove and undoMove
+    return gs.evaluation / evalScale
 
 
 '''Score Board based on material'''
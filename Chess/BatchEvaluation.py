@@ -0,0 +1,46 @@
+"""
+Vectorised evaluation of many positions at once, for offline analysis and training data rather than the search.
+Positions are stacked as N x 12 x 64 arrays of piece planes (plane p, square row * 8 + col is 1 when that piece is
+there) and scored in one matrix product against the baked piece-square tables from Evaluation.
+Needs NumPy, which the game itself does not.
+"""
+import numpy as np
+from Chess.Evaluation import pieceSquareValues, evalScale
+
+planePieces = ["wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]  # piece held by each plane
+planeIndex = {piece: plane for plane, piece in enumerate(planePieces)}
+# the piece-square tables as a 12 x 64 weight matrix, flattened so a batch is scored with a single matrix product
+weights = np.array([pieceSquareValues[piece] for piece in planePieces], dtype=np.float64)
+flatWeights = weights.reshape(12 * 64)
+
+
+# turns 8x8 boards (Gamestate.board) into an N x 12 x 64 array of piece planes
+def boardsToPlanes(boards):
+    planes = np.zeros((len(boards), 12, 64), dtype=np.uint8)
+    for n, board in enumerate(boards):
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece != "--":
+                    planes[n, planeIndex[piece], r * 8 + c] = 1
+    return planes
+
+
+def gamestatesToPlanes(gamestates):
+    return boardsToPlanes([gs.board for gs in gamestates])
+
+
+# scores a batch of piece planes on the same scale as AI.scoreBoard (positive is good for white). Like the
+# material + piece-square part of scoreBoard it does not know about checkmate or draws. chunkSize bounds the
+# temporary float copy made of the planes
+def scoreBoards(planes, chunkSize=65536):
+    planes = np.asarray(planes).reshape(len(planes), 12 * 64)
+    scores = np.empty(len(planes), dtype=np.float64)
+    for start in range(0, len(planes), chunkSize):
+        chunk = planes[start:start + chunkSize]
+        scores[start:start + len(chunk)] = chunk.astype(np.float64) @ flatWeights
+    return scores / evalScale
+
+
+def scoreGamestates(gamestates):
+    return scoreBoards(gamestatesToPlanes(gamestates))
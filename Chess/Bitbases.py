@@ -0,0 +1,247 @@
+"""
+Win/draw bitbases for a king and one piece against a lone king: KQK, KRK and KPK. They are built once by retrograde
+analysis, starting from the checkmates (and, for KPK, the promotions that win in KQK) and working backwards until no
+more wins are found, then written out as one bit per position. Generate them with
+    python -m Chess.Bitbases
+which writes KQK.bin, KRK.bin and KPK.bin (64KB each) into Chess/bitbases. The search maps them with mmap on the first
+probe and looks positions up when only three pieces are left.
+
+The side with the extra piece (the strong side) is always white in the tables, the board is flipped when it is black
+so a pawn always moves up. A position is indexed by (side to move, strong king, piece, weak king) with squares
+numbered row * 8 + col, and its bit is set when the strong side wins with best play.
+"""
+import mmap
+import os
+import time
+from collections import deque
+from Chess.ChessEngine import rookRays, bishopRays
+
+tableNames = ("KQK", "KRK", "KPK")  # KPK looks up KQK for its promotions, so KQK is built first
+tableSize = 2 * 64 * 64 * 64
+STRONG, WEAK = 0, 1  # side to move part of the index
+bitbaseFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+
+
+def positionIndex(sideToMove, strongKing, piece, weakKing):
+    return ((sideToMove * 64 + strongKing) * 64 + piece) * 64 + weakKing
+
+
+def onBoard(r, c):
+    return 0 <= r <= 7 and 0 <= c <= 7
+
+
+kingNeighbours = [[(r + dr) * 8 + c + dc for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                   if (dr or dc) and onBoard(r + dr, c + dc)] for r in range(8) for c in range(8)]
+kingsAdjacent = [[max(abs(a // 8 - b // 8), abs(a % 8 - b % 8)) <= 1 for b in range(64)] for a in range(64)]
+pawnAttacks = [{(r - 1) * 8 + c + dc for dc in (-1, 1) if onBoard(r - 1, c + dc)} for r in range(8) for c in range(8)]
+
+
+def squareRays(rays):  # the engine's (row, col) rays of every square, with the squares numbered row * 8 + col
+    return [tuple(tuple(r * 8 + c for r, c in ray) for _, _, ray in rays[a // 8][a % 8]) for a in range(64)]
+
+
+rookSquareRays = squareRays(rookRays)
+bishopSquareRays = squareRays(bishopRays)
+sliderRays = {"R": rookSquareRays, "Q": [rookSquareRays[a] + bishopSquareRays[a] for a in range(64)]}
+
+
+def buildBetween(rays):  # between[a][b]: squares strictly between a and b on a shared line, or None
+    between = [[None] * 64 for _ in range(64)]
+    for a in range(64):
+        for ray in rays[a]:
+            for i, b in enumerate(ray):
+                between[a][b] = ray[:i]
+    return between
+
+
+rookBetween = buildBetween(rookSquareRays)
+bishopBetween = buildBetween(bishopSquareRays)
+
+
+# does the piece on square piece attack target, with the strong king on blocker the only thing in the way
+def pieceAttacks(pieceType, piece, target, blocker):
+    if pieceType == "P":
+        return target in pawnAttacks[piece]
+    between = rookBetween[piece][target]
+    if between is None and pieceType == "Q":
+        between = bishopBetween[piece][target]
+    return between is not None and blocker not in between
+
+
+# squares a slider can reach from square, stopping in front of either king
+def sliderSquares(pieceType, square, strongKing, weakKing):
+    squares = []
+    for ray in sliderRays[pieceType][square]:
+        for target in ray:
+            if target == strongKing or target == weakKing:
+                break
+            squares.append(target)
+    return squares
+
+
+# squares the piece could have moved from to reach square. Sliders move both ways, a pawn came from below
+def pieceUnmoves(pieceType, square, strongKing, weakKing):
+    if pieceType != "P":
+        return sliderSquares(pieceType, square, strongKing, weakKing)
+    squares = []
+    below = square + 8
+    if square // 8 + 1 <= 6 and below != strongKing and below != weakKing:
+        squares.append(below)
+        if square // 8 == 4 and below + 8 != strongKing and below + 8 != weakKing:  # double push from the start row
+            squares.append(below + 8)
+    return squares
+
+
+def legalPosition(pieceType, sideToMove, strongKing, piece, weakKing):
+    if strongKing == piece or strongKing == weakKing or piece == weakKing or kingsAdjacent[strongKing][weakKing]:
+        return False
+    if pieceType == "P" and not 1 <= piece // 8 <= 6:
+        return False
+    # with the strong side to move the weak king cannot be in check, it would have been the weak side's move
+    return sideToMove == WEAK or not pieceAttacks(pieceType, piece, weakKing, strongKing)
+
+
+# builds the table of one ending, one byte per position (1 = strong side wins). queenTable is the finished KQK table,
+# needed by KPK to score its promotions
+def generateTable(pieceType, queenTable=None):
+    wins = bytearray(tableSize)
+    movesLeft = bytearray(tableSize)  # weak side moves not yet known to lose, a weak position is lost at 0
+    queue = deque()
+    for strongKing in range(64):
+        for piece in range(64):
+            for weakKing in range(64):
+                if not legalPosition(pieceType, WEAK, strongKing, piece, weakKing):
+                    continue
+                index = positionIndex(WEAK, strongKing, piece, weakKing)
+                moves = 0
+                for square in kingNeighbours[weakKing]:
+                    if square == strongKing or kingsAdjacent[square][strongKing]:
+                        continue
+                    if square == piece:
+                        moves += 1  # taking the piece draws, so this move never loses
+                    elif not pieceAttacks(pieceType, piece, square, strongKing):
+                        moves += 1
+                movesLeft[index] = moves
+                if moves == 0 and pieceAttacks(pieceType, piece, weakKing, strongKing):  # checkmate
+                    wins[index] = 1
+                    queue.append(index)
+                # a pawn one step from promoting wins when the queen it becomes wins in KQK
+                if pieceType == "P" and piece // 8 == 1 and legalPosition(pieceType, STRONG, strongKing, piece, weakKing):
+                    queenSquare = piece - 8
+                    if queenSquare != strongKing and queenSquare != weakKing and \
+                            queenTable[positionIndex(WEAK, strongKing, queenSquare, weakKing)]:
+                        strongIndex = positionIndex(STRONG, strongKing, piece, weakKing)
+                        wins[strongIndex] = 1
+                        queue.append(strongIndex)
+
+    while queue:
+        index = queue.popleft()
+        sideToMove, rest = divmod(index, 64 * 64 * 64)
+        strongKing, rest = divmod(rest, 64 * 64)
+        piece, weakKing = divmod(rest, 64)
+        if sideToMove == WEAK:
+            # a lost position for the weak side makes every strong move leading to it a win
+            for previous in kingNeighbours[strongKing]:
+                if previous == piece or previous == weakKing or kingsAdjacent[previous][weakKing]:
+                    continue
+                if pieceAttacks(pieceType, piece, weakKing, previous):
+                    continue
+                previousIndex = positionIndex(STRONG, previous, piece, weakKing)
+                if not wins[previousIndex]:
+                    wins[previousIndex] = 1
+                    queue.append(previousIndex)
+            for previous in pieceUnmoves(pieceType, piece, strongKing, weakKing):
+                if pieceAttacks(pieceType, previous, weakKing, strongKing):
+                    continue
+                previousIndex = positionIndex(STRONG, strongKing, previous, weakKing)
+                if not wins[previousIndex]:
+                    wins[previousIndex] = 1
+                    queue.append(previousIndex)
+        else:
+            # a won position for the strong side takes one escape away from every weak position leading to it
+            for previous in kingNeighbours[weakKing]:
+                if previous == strongKing or previous == piece or kingsAdjacent[previous][strongKing]:
+                    continue
+                previousIndex = positionIndex(WEAK, strongKing, piece, previous)
+                if wins[previousIndex]:
+                    continue
+                movesLeft[previousIndex] -= 1
+                if movesLeft[previousIndex] == 0:
+                    wins[previousIndex] = 1
+                    queue.append(previousIndex)
+    return wins
+
+
+def packBits(table):
+    packed = bytearray(tableSize // 8)
+    for index in range(tableSize):
+        if table[index]:
+            packed[index >> 3] |= 1 << (index & 7)
+    return packed
+
+
+def generateAll(folder=bitbaseFolder):
+    os.makedirs(folder, exist_ok=True)
+    queenTable = None
+    for name in tableNames:
+        startTime = time.perf_counter()
+        table = generateTable(name[1], queenTable)
+        if name == "KQK":
+            queenTable = table
+        with open(os.path.join(folder, name + ".bin"), "wb") as file:
+            file.write(packBits(table))
+        print(f"{name}: {sum(table)} won positions, {time.perf_counter() - startTime:.1f}s")
+
+
+class Bitbases:
+    def __init__(self, folder=bitbaseFolder):
+        self.folder = folder
+        self.tables = {}  # name: mmap, or None when the file is missing
+
+    def getTable(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.folder, name + ".bin")
+            table = None
+            if os.path.isfile(path) and os.path.getsize(path) == tableSize // 8:
+                with open(path, "rb") as file:
+                    table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)  # the map outlives the file
+            self.tables[name] = table
+        return self.tables[name]
+
+    # 1 when the side to move wins, -1 when it loses, 0 for a draw, None when no table covers the position.
+    # Only two kings and at most one other piece may be on the board
+    def probe(self, gs):
+        strongPiece = strongSquare = None
+        kings = {}
+        for r in range(8):
+            for c in range(8):
+                piece = gs.board[r][c]
+                if piece == "--":
+                    continue
+                if piece[1] == "K":
+                    kings[piece[0]] = (r, c)
+                elif strongPiece is None:
+                    strongPiece, strongSquare = piece, (r, c)
+                else:
+                    return None
+        if strongPiece is None:
+            return 0  # two bare kings
+        table = self.getTable("K" + strongPiece[1] + "K")
+        if table is None:
+            return None
+        strongColour = strongPiece[0]
+        weakColour = "b" if strongColour == "w" else "w"
+
+        def square(location):  # flips the board so the strong side plays up it
+            r, c = location
+            return (r if strongColour == "w" else 7 - r) * 8 + c
+        strongToMove = gs.whiteToMove == (strongColour == "w")
+        index = positionIndex(STRONG if strongToMove else WEAK, square(kings[strongColour]), square(strongSquare),
+                              square(kings[weakColour]))
+        if not table[index >> 3] >> (index & 7) & 1:
+            return 0
+        return 1 if strongToMove else -1
+
+
+if __name__ == "__main__":
+    generateAll()
@@ -0,0 +1,293 @@
+"""
+Bitboard backend for the chess engine. BitboardGamestate keeps the same API as ChessEngine.Gamestate
+(makeMove, undoMove, getValidMoves) and the same 8x8 board for the UI, but it also stores every piece type as a
+64-bit integer and generates moves from precomputed attack tables instead of looping over all 64 squares.
+ChessEngine.newGamestate builds it when ChessEngine.gamestateBackend is "bitboard" (Match and Perft take a --backend
+option). makeMove and undoMove still run the whole Gamestate update before toggling the bitboards, so it is not the
+default: the search is no faster with it than with the mailbox.
+"""
+from Chess import ChessEngine
+
+# Squares are numbered row * 8 + col, so square 0 is the top left corner (a8) and square 63 is the bottom right (h1)
+# bit n of a bitboard is set when square n is occupied
+fullBoard = (1 << 64) - 1
+pieceTypes = ("P", "N", "B", "R", "Q", "K")
+pieceIDs = [colour + pieceType for colour in "wb" for pieceType in pieceTypes]
+
+# the directions and steps are ChessEngine's, the first four directions are orthogonal and the last four diagonal
+rookDirections = ChessEngine.orthogonalDirections
+bishopDirections = ChessEngine.diagonalDirections
+kingOffsets = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def squareBit(r, c):
+    return 1 << (r * 8 + c)
+
+
+def iterateSquares(bitboard):  # yields the index of every set bit, lowest first
+    while bitboard:
+        lowestBit = bitboard & -bitboard
+        yield lowestBit.bit_length() - 1
+        bitboard ^= lowestBit
+
+
+def buildStepTable(offsets):  # attack table for pieces that move a fixed step (knight, king)
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr <= 7 and 0 <= c + dc <= 7:
+                attacks |= squareBit(r + dr, c + dc)
+        table.append(attacks)
+    return table
+
+
+knightAttacks = [sum(squareBit(r, c) for r, c in ChessEngine.knightDestinations[sq // 8][sq % 8]) for sq in range(64)]
+kingAttacks = buildStepTable(kingOffsets)
+# squares a pawn of that colour attacks from each square (white pawns move up the board, towards row 0)
+pawnAttacks = {"w": buildStepTable(((-1, -1), (-1, 1))), "b": buildStepTable(((1, -1), (1, 1)))}
+# every square from a square to the edge of the board in one direction, as bitboards of ChessEngine's rays
+rays = {d: [0] * 64 for d in rookDirections + bishopDirections}
+for sq in range(64):
+    for d, _, ray in ChessEngine.rookRays[sq // 8][sq % 8] + ChessEngine.bishopRays[sq // 8][sq % 8]:
+        rays[d][sq] = sum(squareBit(r, c) for r, c in ray)
+# for directions where the square index increases the nearest blocker is the lowest set bit, otherwise the highest
+rookRays = tuple((rays[d], d[0] * 8 + d[1] > 0) for d in rookDirections)
+bishopRays = tuple((rays[d], d[0] * 8 + d[1] > 0) for d in bishopDirections)
+rookPseudoAttacks = [rays[(-1, 0)][sq] | rays[(0, -1)][sq] | rays[(1, 0)][sq] | rays[(0, 1)][sq] for sq in range(64)]
+bishopPseudoAttacks = [rays[(-1, -1)][sq] | rays[(-1, 1)][sq] | rays[(1, 1)][sq] | rays[(1, -1)][sq]
+                       for sq in range(64)]
+
+# between[a][b] holds the squares strictly between a and b, line[a][b] the whole line through a and b
+# both are 0 when the squares do not share a row, column or diagonal. Between is the overlap of the ray from a towards
+# b and the ray from b back towards a
+between = [[0] * 64 for _ in range(64)]
+line = [[0] * 64 for _ in range(64)]
+for startSq in range(64):
+    for d in rookDirections + bishopDirections:
+        reverse = (-d[0], -d[1])
+        fullLine = rays[d][startSq] | rays[reverse][startSq] | (1 << startSq)
+        for endSq in iterateSquares(rays[d][startSq]):
+            between[startSq][endSq] = rays[d][startSq] & rays[reverse][endSq]
+            line[startSq][endSq] = fullLine
+
+
+def slidingAttacks(sq, occupied, directionRays):
+    attacks = 0
+    for rayTable, increasing in directionRays:
+        ray = rayTable[sq]
+        blockers = ray & occupied
+        if blockers:
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= rayTable[blocker]  # remove the squares behind the first blocker
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, rookRays)
+
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, bishopRays)
+
+
+class BitboardGamestate(ChessEngine.Gamestate):
+    def __init__(self, fen=None):
+        super().__init__(fen)
+        self.initialiseBitboards()
+
+    # builds the bitboards from the 8x8 board
+    def initialiseBitboards(self):
+        self.bitboards = {piece: 0 for piece in pieceIDs}
+        self.colourBitboards = {"w": 0, "b": 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.bitboards[piece] |= squareBit(r, c)
+                    self.colourBitboards[piece[0]] |= squareBit(r, c)
+
+    def setupPosition(self, *position):  # covers loadFen and restoreSnapshot
+        super().setupPosition(*position)
+        self.initialiseBitboards()
+
+    def makeMove(self, Move):
+        super().makeMove(Move)
+        self.toggleMove(Move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            Move = self.moveLog[-1]
+            super().undoMove()
+            self.toggleMove(Move)  # xor is its own inverse so the same update undoes the move
+
+    # flips the bits changed by a move on the bitboards
+    def toggleMove(self, Move):
+        allyColour = Move.pieceMoved[0]
+        startBit = squareBit(Move.startRow, Move.startCol)
+        endBit = squareBit(Move.endRow, Move.endCol)
+        self.bitboards[Move.pieceMoved] ^= startBit
+        if Move.isPawnPromotion:
+            self.bitboards[allyColour + "Q"] ^= endBit
+        else:
+            self.bitboards[Move.pieceMoved] ^= endBit
+        self.colourBitboards[allyColour] ^= startBit | endBit
+        if Move.pieceCaptured != "--":
+            captureBit = squareBit(Move.startRow, Move.endCol) if Move.isEnpassantMove else endBit
+            self.bitboards[Move.pieceCaptured] ^= captureBit
+            self.colourBitboards[Move.pieceCaptured[0]] ^= captureBit
+        if Move.isCastleMove:
+            if Move.endCol - Move.startCol == 2:  # Kingside, rook jumps from the h file to the f file
+                rookBits = squareBit(Move.endRow, Move.endCol + 1) | squareBit(Move.endRow, Move.endCol - 1)
+            else:  # Queenside, rook jumps from the a file to the d file
+                rookBits = squareBit(Move.endRow, Move.endCol - 2) | squareBit(Move.endRow, Move.endCol + 1)
+            self.bitboards[allyColour + "R"] ^= rookBits
+            self.colourBitboards[allyColour] ^= rookBits
+
+    # all pieces of colour that attack sq, given the occupied squares
+    def attackersTo(self, sq, occupied, colour):
+        bitboards = self.bitboards
+        queens = bitboards[colour + "Q"]
+        return ((knightAttacks[sq] & bitboards[colour + "N"]) |
+                (kingAttacks[sq] & bitboards[colour + "K"]) |
+                (pawnAttacks["b" if colour == "w" else "w"][sq] & bitboards[colour + "P"]) |
+                (bishopAttacks(sq, occupied) & (bitboards[colour + "B"] | queens)) |
+                (rookAttacks(sq, occupied) & (bitboards[colour + "R"] | queens)))
+
+    # determines if enemy can attack the square (r,c)
+    def squareUnderAttack(self, r, c):
+        enemyColour = "b" if self.whiteToMove else "w"
+        occupied = self.colourBitboards["w"] | self.colourBitboards["b"]
+        return self.attackersTo(r * 8 + c, occupied, enemyColour) != 0
+
+    # moves with checks in mind
+    def getValidMoves(self):
+        moves = self.generateMoves(True, True)
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        self.updateDrawRules()
+        return moves
+
+    # legal captures only for the quiescence search, or every legal move when in check. The bitboards give the pins
+    # directly, so pinsAndChecks (see Gamestate.setPinsAndChecks) is accepted for the staged search but not needed
+    def getCaptureMoves(self, pinsAndChecks=None):
+        moves = self.generateMoves(True, False)
+        if self.inCheck:
+            return self.getValidMoves()
+        return moves
+
+    # legal moves that capture nothing, the rest of the moves after getCaptureMoves
+    def getQuietMoves(self, pinsAndChecks=None):
+        return self.generateMoves(False, True)
+
+    # the legal captures (en passant and capturing promotions included), the legal moves to empty squares, or both
+    def generateMoves(self, captures, quiets):
+        moves = []
+        allyColour, enemyColour = ("w", "b") if self.whiteToMove else ("b", "w")
+        allies = self.colourBitboards[allyColour]
+        enemies = self.colourBitboards[enemyColour]
+        occupied = allies | enemies
+        kingBit = self.bitboards[allyColour + "K"]
+        kingSq = kingBit.bit_length() - 1
+        checkers = self.attackersTo(kingSq, occupied, enemyColour)
+        self.inCheck = checkers != 0
+        if checkers and not quiets:
+            return moves  # the caller generates every evasion instead
+        targets = (enemies if captures else 0) | (~occupied & fullBoard if quiets else 0)
+
+        # king moves, the king is removed from the board so it cannot hide behind itself along a slider's line
+        for endSq in iterateSquares(kingAttacks[kingSq] & targets):
+            if not self.attackersTo(endSq, occupied ^ kingBit, enemyColour):
+                self.addMove(kingSq, endSq, moves)
+
+        if checkers & (checkers - 1) == 0:  # not in double check, so other pieces may move
+            if checkers:  # single check, capture the checking piece or block its line
+                checkerSq = checkers.bit_length() - 1
+                targets &= checkers | between[kingSq][checkerSq]
+
+            # pinned pieces may only move along the line between the king and the pinning piece
+            pinLines = {}
+            enemyQueens = self.bitboards[enemyColour + "Q"]
+            snipers = ((rookPseudoAttacks[kingSq] & (self.bitboards[enemyColour + "R"] | enemyQueens)) |
+                       (bishopPseudoAttacks[kingSq] & (self.bitboards[enemyColour + "B"] | enemyQueens)))
+            for sniperSq in iterateSquares(snipers):
+                blockers = between[kingSq][sniperSq] & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & allies:
+                    pinLines[blockers.bit_length() - 1] = line[kingSq][sniperSq]
+
+            for startSq in iterateSquares(self.bitboards[allyColour + "N"]):
+                if startSq not in pinLines:  # a pinned knight can never move
+                    self.addMoves(startSq, knightAttacks[startSq] & targets, moves)
+            for startSq in iterateSquares(self.bitboards[allyColour + "B"] | self.bitboards[allyColour + "Q"]):
+                self.addMoves(startSq, bishopAttacks(startSq, occupied) & targets & pinLines.get(startSq, fullBoard),
+                              moves)
+            for startSq in iterateSquares(self.bitboards[allyColour + "R"] | self.bitboards[allyColour + "Q"]):
+                self.addMoves(startSq, rookAttacks(startSq, occupied) & targets & pinLines.get(startSq, fullBoard),
+                              moves)
+            self.getPawnBitboardMoves(allyColour, enemyColour, occupied, targets, pinLines, moves, captures, quiets)
+            if not checkers and quiets:
+                self.getCastleBitboardMoves(allyColour, enemyColour, occupied, kingSq, moves)
+        return moves
+
+    def getPawnBitboardMoves(self, allyColour, enemyColour, occupied, targets, pinLines, moves, captures=True,
+                             quiets=True):
+        step, startRow = (-8, 6) if allyColour == "w" else (8, 1)
+        enemies = self.colourBitboards[enemyColour]
+        for startSq in iterateSquares(self.bitboards[allyColour + "P"]):
+            allowed = targets & pinLines.get(startSq, fullBoard)
+            endSq = startSq + step
+            if quiets and not occupied & (1 << endSq):  # 1 square pawn forward
+                if allowed & (1 << endSq):
+                    self.addMove(startSq, endSq, moves)
+                if startSq // 8 == startRow and not occupied & (1 << (endSq + step)) and allowed & (
+                        1 << (endSq + step)):  # 2 square pawn forward
+                    self.addMove(startSq, endSq + step, moves)
+            self.addMoves(startSq, pawnAttacks[allyColour][startSq] & enemies & allowed, moves)
+
+        if captures and self.enpassantPossible != ():
+            epSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+            capturedBit = 1 << (epSq - step)
+            kingSq = self.bitboards[allyColour + "K"].bit_length() - 1
+            for startSq in iterateSquares(pawnAttacks[enemyColour][epSq] & self.bitboards[allyColour + "P"]):
+                # play the capture on the occupancy and check the king directly, this covers pins along the rank
+                # the capturing pawn and the captured pawn leave together
+                afterOccupied = (occupied ^ (1 << startSq) ^ capturedBit) | (1 << epSq)
+                enemyQueens = self.bitboards[enemyColour + "Q"]
+                if (rookAttacks(kingSq, afterOccupied) & (self.bitboards[enemyColour + "R"] | enemyQueens)) or (
+                        bishopAttacks(kingSq, afterOccupied) & (self.bitboards[enemyColour + "B"] | enemyQueens)) or (
+                        knightAttacks[kingSq] & self.bitboards[enemyColour + "N"]) or (
+                        pawnAttacks[allyColour][kingSq] & self.bitboards[enemyColour + "P"] & ~capturedBit):
+                    continue
+                moves.append(ChessEngine.move(divmod(startSq, 8), divmod(epSq, 8), self.board, isEnPassantMove=True))
+
+    def getCastleBitboardMoves(self, allyColour, enemyColour, occupied, kingSq, moves):
+        if allyColour == "w":
+            kingside, queenside = self.currentCastlingRights.wks, self.currentCastlingRights.wqs
+        else:
+            kingside, queenside = self.currentCastlingRights.bks, self.currentCastlingRights.bqs
+        if kingside and not occupied & ((1 << (kingSq + 1)) | (1 << (kingSq + 2))):
+            if not self.attackersTo(kingSq + 1, occupied, enemyColour) and not self.attackersTo(kingSq + 2, occupied,
+                                                                                                   enemyColour):
+                moves.append(ChessEngine.move(divmod(kingSq, 8), divmod(kingSq + 2, 8), self.board, isCastleMove=True))
+        if queenside and not occupied & ((1 << (kingSq - 1)) | (1 << (kingSq - 2)) | (1 << (kingSq - 3))):
+            if not self.attackersTo(kingSq - 1, occupied, enemyColour) and not self.attackersTo(kingSq - 2, occupied,
+                                                                                                   enemyColour):
+                moves.append(ChessEngine.move(divmod(kingSq, 8), divmod(kingSq - 2, 8), self.board, isCastleMove=True))
+
+    def addMove(self, startSq, endSq, moves):
+        moves.append(ChessEngine.move(divmod(startSq, 8), divmod(endSq, 8), self.board))
+
+    def addMoves(self, startSq, targets, moves):
+        for endSq in iterateSquares(targets):
+            moves.append(ChessEngine.move(divmod(startSq, 8), divmod(endSq, 8), self.board))
@@ -3,13 +3,97 @@ This class is responsible for storing all the information about current state of
 It will also be responsible for determining the valid moves at the current state. It will also keep a move
 log.
 """
-import pygame as p
+import random
+from Chess.Evaluation import pieceSquareValues
+
+# Zobrist hashing: every (piece, square) pair, the side to move, each castling right and each en passant column gets
+# a fixed random 64-bit number. The key of a position is the xor of the numbers of everything in it, so a move only
+# has to xor in and out the few numbers it changes. A fixed seed keeps keys the same across runs and processes
+zobristRandom = random.Random(1)
+zobristPieces = {colour + pieceType: [zobristRandom.getrandbits(64) for _ in range(64)]
+                 for colour in "wb" for pieceType in "PNBRQK"}
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = {right: zobristRandom.getrandbits(64) for right in ("wks", "bks", "wqs", "bqs")}
+zobristEnpassant = [zobristRandom.getrandbits(64) for _ in range(8)]  # indexed by the column of the en passant square
+
+
+# 10x12 mailbox: the 8x8 board sits inside a border two squares deep at the top and bottom and one square at the sides,
+# so stepping off the board from any square (even a knight jump) lands on an OFFBOARD sentinel instead of needing a
+# bounds test. Each square holds a small integer: a colour bit plus the piece type.
+# The mailbox is an add-on next to the string board, not a replacement: board stays the primary representation that
+# the moves, FEN, evaluation and the window read, and makeMove/undoMove write the few squares a move changes into
+# both. The mailbox is what the attack and check detection loops over, since a byte compare is cheaper than a string one
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+PIECETYPE = 7  # mask for the piece type bits
+WHITE = 8
+BLACK = 16
+OFFBOARD = 32
+pieceCodes = {"--": EMPTY}
+for colour, colourBit in (("w", WHITE), ("b", BLACK)):
+    for pieceType, typeCode in zip("PNBRQK", (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)):
+        pieceCodes[colour + pieceType] = colourBit | typeCode
+codePieces = {code: piece for piece, code in pieceCodes.items()}
+# mailbox offsets with the matching (row, col) directions, the first four are orthogonal and the last four diagonal
+rayOffsets = ((-10, (-1, 0)), (-1, (0, -1)), (10, (1, 0)), (1, (0, 1)),
+              (-11, (-1, -1)), (-9, (-1, 1)), (9, (1, -1)), (11, (1, 1)))
+knightOffsets = ((-21, (-2, -1)), (-19, (-2, 1)), (21, (2, 1)), (19, (2, -1)),
+                 (12, (1, 2)), (-12, (-1, -2)), (8, (1, -2)), (-8, (-1, 2)))
+
+orthogonalOffsets = tuple(offset for offset, _ in rayOffsets[:4])
+diagonalOffsets = tuple(offset for offset, _ in rayOffsets[4:])
+sliderOffsets = {ROOK: orthogonalOffsets, BISHOP: diagonalOffsets, QUEEN: orthogonalOffsets + diagonalOffsets}
+boardIndices = [21 + r * 10 + c for r in range(8) for c in range(8)]  # mailbox index of every square on the board
+
+# per square tables for the (row, col) generator, built once at import and shared by every Gamestate and process:
+# the knight's destinations on the board, and for the sliders every direction with the squares along it in order
+orthogonalDirections = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
+diagonalDirections = ((-1, -1), (-1, 1), (1, 1), (1, -1))
+knightSteps = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, -2), (1, 2), (-1, 2), (-1, -2))
+
+
+def buildRays(r, c, directions):
+    rays = []
+    for d in directions:
+        ray = tuple((r + d[0] * i, c + d[1] * i) for i in range(1, 8)
+                    if 0 <= r + d[0] * i <= 7 and 0 <= c + d[1] * i <= 7)
+        if ray:
+            rays.append((d, (-d[0], -d[1]), ray))  # the reverse direction is kept for the pin test
+    return tuple(rays)
+
+
+knightDestinations = [[tuple((r + dr, c + dc) for dr, dc in knightSteps if 0 <= r + dr <= 7 and 0 <= c + dc <= 7)
+                       for c in range(8)] for r in range(8)]
+rookRays = [[buildRays(r, c, orthogonalDirections) for c in range(8)] for r in range(8)]
+bishopRays = [[buildRays(r, c, diagonalDirections) for c in range(8)] for r in range(8)]
+
+
+# move generator behind newGamestate: "mailbox" (Gamestate) or "bitboard" (Bitboard.BitboardGamestate). Both generate
+# the same moves, but the bitboard one still keeps the string board and mailbox up to date on top of its bitboards,
+# so the search is no faster with it and usually a little slower
+gamestateBackend = "mailbox"
+
+
+def mailboxIndex(r, c):
+    return 21 + r * 10 + c
+
+
+def castleRightsKey(castleRights):
+    key = 0
+    if castleRights.wks:
+        key ^= zobristCastling["wks"]
+    if castleRights.bks:
+        key ^= zobristCastling["bks"]
+    if castleRights.wqs:
+        key ^= zobristCastling["wqs"]
+    if castleRights.bqs:
+        key ^= zobristCastling["bqs"]
+    return key
 
-p.init()
 
 # Rows start at 0 at the top and 7 at the bottom, while columns start from 0 at the leftmost and 7 at the rightmost
 class Gamestate:
-    def __init__(self):
+    def __init__(self, fen=None):  # the starting position, or the position of a FEN string
         # board is a 8x8 2d list, each element of the list has two characters, the first character represents
         # the colour of piece "b" or "w", the second character represents the type of the piece, "K", "Q", "R",
         # "B", "N" or "P"
@@ -44,9 +128,139 @@ class Gamestate:
         self.currentCastlingRights = CastleRights(True, True, True, True)
         self.CastleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                              self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        self.squares = self.computeSquares()  # integer coded 10x12 mailbox, updated alongside board
+        self.pieceCount = 32  # pieces on the board, kings included
+        self.halfmoveClock = 0  # plies since the last capture or pawn move, for the fifty move rule
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.zobristKey = self.computeZobristKey()  # 64-bit key identifying the position
+        self.zobristKeyLog = [self.zobristKey]
+        self.repetitionCounts = {self.zobristKey: 1}  # times each position of the game has been reached
+        self.evaluation = self.computeEvaluation()  # material + piece-square score, positive is good for white
+        self.startFullmoveNumber = 1  # fullmove number of the position the move log starts from
+        self.startSnapshot = self.getSnapshot()  # the position the move log starts from, see getSnapshot
+        if fen is not None:
+            self.loadFen(fen)
+
+    # sets up the position of a FEN string (e.g. "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    # the move log starts empty so the position cannot be undone past this point
+    def loadFen(self, fen):
+        fields = fen.split()
+        board = []
+        for rowText in fields[0].split("/"):
+            row = []
+            for char in rowText:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))  # digits count empty squares
+                else:
+                    row.append(("w" if char.isupper() else "b") + char.upper())  # upper case pieces are white
+            board.append(row)
+        castling = fields[2] if len(fields) > 2 else "-"
+        enpassant = fields[3] if len(fields) > 3 else "-"
+        if enpassant != "-":
+            enpassant = (move.ranksToRows[enpassant[1]], move.filesToCols[enpassant[0].upper()])
+        else:
+            enpassant = ()
+        self.setupPosition(board, len(fields) < 2 or fields[1] == "w",
+                           CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling), enpassant,
+                           int(fields[4]) if len(fields) > 4 else 0, int(fields[5]) if len(fields) > 5 else 1)
+
+    # the FEN string of the current position
+    def getFen(self):
+        rows = []
+        for row in self.board:
+            rowText, empty = "", 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rowText += str(empty)
+                    empty = 0
+                rowText += piece[1] if piece[0] == "w" else piece[1].lower()
+            rows.append(rowText + (str(empty) if empty else ""))
+        castleRights = self.currentCastlingRights
+        castling = "K" * castleRights.wks + "Q" * castleRights.wqs + "k" * castleRights.bks + "q" * castleRights.bqs
+        enpassant = "-"
+        if self.enpassantPossible != ():
+            enpassant = move.colsToFiles[self.enpassantPossible[1]].lower() + move.rowsToRanks[self.enpassantPossible[0]]
+        return " ".join(("/".join(rows), "w" if self.whiteToMove else "b", castling or "-", enpassant,
+                         str(self.halfmoveClock), str(self.getFullmoveNumber())))
+
+    def getFullmoveNumber(self):  # starts at 1 and goes up after every black move
+        startedWithWhite = self.whiteToMove == (len(self.moveLog) % 2 == 0)
+        return self.startFullmoveNumber + (len(self.moveLog) + (0 if startedWithWhite else 1)) // 2
+
+    # the position without its history in 37 bytes: the 64 squares as 4 bit piece codes (piece type, plus 8 for
+    # black), then side to move and castling rights, the en passant square (255 for none), the halfmove clock and
+    # the fullmove number. Restoring it is much cheaper than pickling a Gamestate or replaying its moves
+    def getSnapshot(self):
+        snapshot = bytearray(32)
+        for r in range(8):
+            for c in range(8):
+                code = pieceCodes[self.board[r][c]]
+                nibble = (code & PIECETYPE) | (8 if code & BLACK else 0)
+                snapshot[(r * 8 + c) >> 1] |= nibble << (4 * (c & 1))
+        castleRights = self.currentCastlingRights
+        snapshot.append(self.whiteToMove | castleRights.wks << 1 | castleRights.wqs << 2 | castleRights.bks << 3 |
+                        castleRights.bqs << 4)
+        snapshot.append(self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible else 255)
+        snapshot.append(min(self.halfmoveClock, 255))
+        snapshot += min(self.getFullmoveNumber(), 65535).to_bytes(2, "big")
+        return bytes(snapshot)
+
+    # sets up the position of a getSnapshot, the move log starts empty like after loadFen
+    def restoreSnapshot(self, snapshot):
+        board = []
+        for r in range(8):
+            row = []
+            for c in range(8):
+                nibble = snapshot[(r * 8 + c) >> 1] >> (4 * (c & 1)) & 15
+                row.append(codePieces[(nibble & PIECETYPE) | (BLACK if nibble & 8 else WHITE)] if nibble else "--")
+            board.append(row)
+        flags = snapshot[32]
+        enpassant = divmod(snapshot[33], 8) if snapshot[33] != 255 else ()
+        self.setupPosition(board, bool(flags & 1), CastleRights(bool(flags & 2), bool(flags & 8), bool(flags & 4),
+                                                                bool(flags & 16)),
+                           enpassant, snapshot[34], int.from_bytes(snapshot[35:37], "big"))
+
+    # replaces the position and rebuilds everything derived from the board, shared by loadFen and restoreSnapshot
+    def setupPosition(self, board, whiteToMove, castleRights, enpassantPossible, halfmoveClock, fullmoveNumber):
+        self.board = board
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == "wK":
+                    self.whiteKingLocation = (r, c)
+                elif self.board[r][c] == "bK":
+                    self.blackKingLocation = (r, c)
+        self.whiteToMove = whiteToMove
+        self.currentCastlingRights = castleRights
+        self.CastleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
+                                             self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        self.enpassantPossible = enpassantPossible
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.moveLog = []
+        self.startFullmoveNumber = fullmoveNumber
+        self.checkMate = False
+        self.staleMate = False
+        self.threeMoveDrawRule = False
+        self.fiftyMoveDrawRule = False
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.squares = self.computeSquares()
+        self.pieceCount = sum(piece != "--" for row in self.board for piece in row)
+        self.halfmoveClock = halfmoveClock
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        self.repetitionCounts = {self.zobristKey: 1}
+        self.evaluation = self.computeEvaluation()
+        self.startSnapshot = self.getSnapshot()
+
     # takes move as parameter and executes it, this will not work for castling
     # and en passant and pawn promotion
     def makeMove(self, Move):
+        previousEnpassantKey = self.enpassantZobristKey()  # read before the move changes the pawns next to it
         self.board[Move.startRow][Move.startCol] = "--"
         self.board[Move.endRow][Move.endCol] = Move.pieceMoved
         self.moveLog.append(Move)  # log the moves so we can undo it later
@@ -85,10 +299,135 @@ class Gamestate:
                 self.board[Move.endRow][Move.endCol - 2] = '--'  # erases old rook
 
         self.enpassantPossibleLog.append(self.enpassantPossible)
+        # a capture or pawn move can never be repeated, so it restarts the fifty move count
+        if Move.pieceCaptured != "--":
+            self.pieceCount -= 1
+        if Move.pieceMoved[1] == 'P' or Move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
         # update castling rights - whenever it is a rook or king move
         self.updateCastleRights(Move)
         self.CastleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                                  self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+        self.updateSquares(Move)
+        self.updateZobristKey(Move, previousEnpassantKey)
+        self.evaluation += self.evaluationDelta(Move)
+
+    # writes the squares a move changed into the mailbox, from the move itself rather than by reading board back.
+    # undo puts the pieces back where they were before the move
+    def updateSquares(self, Move, undo=False):
+        squares = self.squares
+        start = 21 + Move.startRow * 10 + Move.startCol
+        end = 21 + Move.endRow * 10 + Move.endCol
+        moved = pieceCodes[Move.pieceMoved]
+        captured = pieceCodes[Move.pieceCaptured]
+        if undo:
+            squares[start] = moved
+            squares[end] = EMPTY if Move.isEnpassantMove else captured
+        else:
+            squares[start] = EMPTY
+            squares[end] = (moved & ~PIECETYPE) | QUEEN if Move.isPawnPromotion else moved
+        if Move.isEnpassantMove:
+            squares[start - Move.startCol + Move.endCol] = captured if undo else EMPTY
+        if Move.isCastleMove:
+            if Move.endCol > Move.startCol:  # Kingside
+                rookStart, rookEnd = end + 1, end - 1
+            else:  # Queenside
+                rookStart, rookEnd = end - 2, end + 1
+            if undo:
+                rookStart, rookEnd = rookEnd, rookStart
+            squares[rookEnd] = squares[rookStart]
+            squares[rookStart] = EMPTY
+
+    # builds the mailbox from board, every square outside the 8x8 is OFFBOARD
+    def computeSquares(self):
+        squares = bytearray([OFFBOARD]) * 120
+        for r in range(8):
+            for c in range(8):
+                squares[21 + r * 10 + c] = pieceCodes[self.board[r][c]]
+        return squares
+
+    # change in material + piece-square score made by a move, added by makeMove and subtracted by undoMove
+    def evaluationDelta(self, Move):
+        allyColour = Move.pieceMoved[0]
+        endPiece = allyColour + 'Q' if Move.isPawnPromotion else Move.pieceMoved
+        delta = (pieceSquareValues[endPiece][Move.endRow * 8 + Move.endCol] -
+                 pieceSquareValues[Move.pieceMoved][Move.startRow * 8 + Move.startCol])
+        if Move.pieceCaptured != "--":
+            captureRow = Move.startRow if Move.isEnpassantMove else Move.endRow
+            delta -= pieceSquareValues[Move.pieceCaptured][captureRow * 8 + Move.endCol]
+        if Move.isCastleMove:
+            if Move.endCol - Move.startCol == 2:  # Kingside
+                rookStartCol, rookEndCol = Move.endCol + 1, Move.endCol - 1
+            else:  # Queenside
+                rookStartCol, rookEndCol = Move.endCol - 2, Move.endCol + 1
+            rookValues = pieceSquareValues[allyColour + 'R']
+            delta += rookValues[Move.endRow * 8 + rookEndCol] - rookValues[Move.endRow * 8 + rookStartCol]
+        return delta
+
+    # material + piece-square score of the current position from scratch
+    def computeEvaluation(self):
+        evaluation = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    evaluation += pieceSquareValues[self.board[r][c]][r * 8 + c]
+        return evaluation
+
+    # xors the pieces, side, castling rights and en passant column changed by a move into the zobrist key,
+    # called at the end of makeMove once the castling and en passant logs hold the new values
+    def updateZobristKey(self, Move, previousEnpassantKey):
+        key = self.zobristKey ^ zobristBlackToMove
+        allyColour = Move.pieceMoved[0]
+        endPiece = allyColour + 'Q' if Move.isPawnPromotion else Move.pieceMoved
+        key ^= zobristPieces[Move.pieceMoved][Move.startRow * 8 + Move.startCol]
+        key ^= zobristPieces[endPiece][Move.endRow * 8 + Move.endCol]
+        if Move.pieceCaptured != "--":
+            captureRow = Move.startRow if Move.isEnpassantMove else Move.endRow  # en passant pawn is beside the start
+            key ^= zobristPieces[Move.pieceCaptured][captureRow * 8 + Move.endCol]
+        if Move.isCastleMove:
+            if Move.endCol - Move.startCol == 2:  # Kingside
+                rookStartCol, rookEndCol = Move.endCol + 1, Move.endCol - 1
+            else:  # Queenside
+                rookStartCol, rookEndCol = Move.endCol - 2, Move.endCol + 1
+            key ^= zobristPieces[allyColour + 'R'][Move.endRow * 8 + rookStartCol]
+            key ^= zobristPieces[allyColour + 'R'][Move.endRow * 8 + rookEndCol]
+        key ^= castleRightsKey(self.CastleRightsLog[-2]) ^ castleRightsKey(self.CastleRightsLog[-1])
+        key ^= previousEnpassantKey ^ self.enpassantZobristKey()
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
+        self.repetitionCounts[key] = self.repetitionCounts.get(key, 0) + 1
+
+    # builds the zobrist key of the current position from scratch
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    key ^= zobristPieces[self.board[r][c]][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= zobristBlackToMove
+        key ^= castleRightsKey(self.currentCastlingRights)
+        return key ^ self.enpassantZobristKey()
+
+    # True when a pawn of the side to move stands next to the pawn that just moved two squares, so it could take it
+    # en passant. Checks and pins are not looked at, the same rule the Polyglot book key uses
+    def enpassantCapturePossible(self):
+        if self.enpassantPossible == ():
+            return False
+        enpassantRow, enpassantCol = self.enpassantPossible
+        allyPawn, pawnRow = ("wP", enpassantRow + 1) if self.whiteToMove else ("bP", enpassantRow - 1)
+        for pawnCol in (enpassantCol - 1, enpassantCol + 1):
+            if 0 <= pawnCol <= 7 and self.board[pawnRow][pawnCol] == allyPawn:
+                return True
+        return False
+
+    # the en passant part of the zobrist key. The column is only hashed when the capture is possible, so a double push
+    # nobody can answer leaves the same key as the position reached without it, and repetitions are found by position
+    def enpassantZobristKey(self):
+        return zobristEnpassant[self.enpassantPossible[1]] if self.enpassantCapturePossible() else 0
 
     # undo the last move
     def undoMove(self):
@@ -114,8 +453,22 @@ class Gamestate:
 
             # Undo Castling Rights
             self.CastleRightsLog.pop()  # get rid of new castle rights from move we are undoing
-            self.currentCastlingRights = self.CastleRightsLog[
-                -1]  # set the current castle rights to the last one in the list
+            lastCastleRights = self.CastleRightsLog[-1]  # set the current castle rights to the last one in the list
+            # copied so that updateCastleRights on the next move does not change the entry stored in the log
+            self.currentCastlingRights = CastleRights(lastCastleRights.wks, lastCastleRights.bks,
+                                                      lastCastleRights.wqs, lastCastleRights.bqs)
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if move.pieceCaptured != "--":
+                self.pieceCount += 1
+            count = self.repetitionCounts[self.zobristKey] - 1
+            if count:
+                self.repetitionCounts[self.zobristKey] = count
+            else:  # dropped so the positions a search visits do not pile up for the rest of the game
+                del self.repetitionCounts[self.zobristKey]
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+            self.evaluation -= self.evaluationDelta(move)
             # Undo Castle Move
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:  # Kingside
@@ -126,6 +479,7 @@ class Gamestate:
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][
                         move.endCol + 1]  # Moves rook back
                     self.board[move.endRow][move.endCol + 1] = '--'  # erases old rook position after undoing
+            self.updateSquares(move, True)
 
             self.checkMate = False
             self.staleMate = False
@@ -187,36 +541,7 @@ class Gamestate:
             kingCol = self.blackKingLocation[1]
         if self.inCheck:
             if len(self.checks) == 1:  # only 1 check, block check or move king
-                moves = self.getAllPossibleMoves()
-                # to block a check you must move a piece into one of the squares between the enemy piece and king
-                check = self.checks[0]  # check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]  # enemy piece causing the check
-                validSquares = []  # squares that piece can move to
-
-                # if knight, must capture knight or move king, other pieces can be blocked
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + (check[2] * i),
-                                       kingCol + (check[3] * i))  # check[2] and check[3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[
-                            1] == checkCol:  # once you get to piece and checks
-                            break
-                # get rid of any moves that do not block check or move king
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved[1] != 'K':
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            if moves[i].isEnpassantMove:
-                                capturedCol = moves[i].endCol
-                                capturedRow = moves[i].endRow + 1 if self.whiteToMove else moves[i].endRow - 1
-                                if not (capturedRow, capturedCol) in validSquares:
-                                    moves.remove(moves[i])
-                            else:
-                                moves.remove(moves[i])
+                moves = self.getEvasionMoves(kingRow, kingCol, self.checks[0])
             else:  # double check, king has to move
                 self.getKingMoves(kingRow, kingCol, moves)
 
@@ -239,34 +564,85 @@ class Gamestate:
             self.checkMate = False
             self.staleMate = False
 
-        # Fifty Move Draw rule
-        FiftyMoveDraw = 0
-        for Move in self.moveLog:  # check all moves
-            if (Move.pieceMoved[1] != 'P') and Move.pieceCaptured == "--":  # check if move adds to draw counter
-                FiftyMoveDraw += 1
-            else:
-                FiftyMoveDraw = 0  # reset draw counter (draw conducive moves have to be consecutive)
-            if FiftyMoveDraw >= 50:  # check if draw counter has exceeded 50 moves
-                self.fiftyMoveDrawRule = True  # set stalemate
-
-        # 3 repeated move rule
-        threeMoveDrawCounterWhite = 0
-        threeMoveDrawCounterBlack = 0
-        if len(self.moveLog) >= 5:
-            for i in range(0, len(self.moveLog) - 5, 2):
-                if self.moveLog[i] == self.moveLog[i + 4]:
-                    threeMoveDrawCounterWhite += 1
-                else:
-                    threeMoveDrawCounterWhite = 0
-                if self.moveLog[i + 1] == self.moveLog[i + 5]:
-                    threeMoveDrawCounterBlack += 1
-                else:
-                    threeMoveDrawCounterBlack = 0
-            if threeMoveDrawCounterWhite >= 3 and threeMoveDrawCounterBlack >= 3:
-                self.threeMoveDrawRule = True
+        self.updateDrawRules()
         self.currentCastlingRights = tempCastleRights
         return moves
 
+    # legal moves out of a single check: king moves, plus moves of unpinned pieces onto the checking piece or a
+    # square between it and the king, found by looking outward from those squares instead of generating every move
+    def getEvasionMoves(self, kingRow, kingCol, check):
+        moves = []
+        self.getKingMoves(kingRow, kingCol, moves)
+        checkRow, checkCol = check[0], check[1]
+        # to block a check you must move a piece into one of the squares between the enemy piece and king,
+        # if knight, must capture knight or move king
+        targets = [(checkRow, checkCol)]
+        if self.board[checkRow][checkCol][1] != 'N':
+            for i in range(1, 8):
+                target = (kingRow + check[2] * i, kingCol + check[3] * i)
+                if target == (checkRow, checkCol):
+                    break
+                targets.append(target)
+        board = self.board
+        squares = self.squares
+        pinned = {(pin[0], pin[1]) for pin in self.pins}  # a pinned piece can never capture the checker or block
+        if self.whiteToMove:
+            allyColour, allyPawn, moveAmount, doublePushRow = WHITE, "wP", -1, 4
+        else:
+            allyColour, allyPawn, moveAmount, doublePushRow = BLACK, "bP", 1, 3
+        allyKnight, allyQueen = allyColour | KNIGHT, allyColour | QUEEN
+        for targetRow, targetCol in targets:
+            targetSq = (targetRow, targetCol)
+            target = 21 + targetRow * 10 + targetCol
+            for offset, m in knightOffsets:
+                if squares[target + offset] == allyKnight:
+                    startSq = (targetRow + m[0], targetCol + m[1])
+                    if startSq not in pinned:
+                        moves.append(move(startSq, targetSq, board))
+            for j in range(8):
+                offset, d = rayOffsets[j]
+                index = target + offset
+                i = 1
+                while squares[index] == EMPTY:
+                    index += offset
+                    i += 1
+                piece = squares[index]
+                if piece == allyQueen or piece == allyColour | (ROOK if j <= 3 else BISHOP):
+                    startSq = (targetRow + d[0] * i, targetCol + d[1] * i)
+                    if startSq not in pinned:
+                        moves.append(move(startSq, targetSq, board))
+            pawnRow = targetRow - moveAmount
+            if not 0 <= pawnRow <= 7:
+                continue
+            if targetSq == (checkRow, checkCol):  # pawn captures of the checker
+                for pawnCol in (targetCol - 1, targetCol + 1):
+                    if 0 <= pawnCol <= 7 and board[pawnRow][pawnCol] == allyPawn and (pawnRow, pawnCol) not in pinned:
+                        moves.append(move((pawnRow, pawnCol), targetSq, board))
+            else:  # pawn pushes onto an empty blocking square
+                if board[pawnRow][targetCol] == allyPawn:
+                    if (pawnRow, targetCol) not in pinned:
+                        moves.append(move((pawnRow, targetCol), targetSq, board))
+                elif (targetRow == doublePushRow and board[pawnRow][targetCol] == "--" and
+                      board[pawnRow - moveAmount][targetCol] == allyPawn and (pawnRow - moveAmount, targetCol) not in pinned):
+                    moves.append(move((pawnRow - moveAmount, targetCol), targetSq, board))
+        # en passant evades a check given by the pawn it takes, getPawnMoves has the test for the king's rank
+        if self.enpassantPossible != ():
+            enpassantRow, enpassantCol = self.enpassantPossible
+            capturedSq = (enpassantRow - moveAmount, enpassantCol)
+            if capturedSq in targets or self.enpassantPossible in targets:
+                for pawnCol in (enpassantCol - 1, enpassantCol + 1):
+                    if 0 <= pawnCol <= 7 and board[capturedSq[0]][pawnCol] == allyPawn and \
+                            (capturedSq[0], pawnCol) not in pinned:
+                        pawnMoves = []
+                        self.getPawnMoves(capturedSq[0], pawnCol, pawnMoves)
+                        moves.extend(m for m in pawnMoves if m.isEnpassantMove)
+        return moves
+
+    # sets the fifty move and threefold repetition draw flags, both are kept up to date by makeMove and undoMove
+    def updateDrawRules(self):
+        self.fiftyMoveDrawRule = self.halfmoveClock >= 100  # fifty moves by each side
+        self.threeMoveDrawRule = self.repetitionCounts[self.zobristKey] >= 3
+
     # determines if current player is in check
     def inCheck(self):
         if self.whiteToMove:
@@ -274,98 +650,163 @@ class Gamestate:
         else:
             return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
 
-    # determines if enemy can attack the square (r,c)
+    # determines if enemy can attack the square (r,c), looking outward from it for a pawn, knight or king one step away
+    # or a slider at the end of a ray
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove  # switch turns
-        # generate all opponent's possible moves
-        opponentMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove  # switch turns back
-        for Move in opponentMoves:
-            if Move.endRow == r and Move.endCol == c:  # square is under attack
+        squares = self.squares
+        if self.whiteToMove:
+            enemyColour, pawnOffsets = BLACK, (-11, -9)  # black pawns capture downwards, so they attack from above
+        else:
+            enemyColour, pawnOffsets = WHITE, (9, 11)
+        target = 21 + r * 10 + c
+        enemyPawn = enemyColour | PAWN
+        for offset in pawnOffsets:
+            if squares[target + offset] == enemyPawn:
+                return True
+        enemyKnight = enemyColour | KNIGHT
+        for offset, _ in knightOffsets:
+            if squares[target + offset] == enemyKnight:
+                return True
+        enemyKing, enemyQueen = enemyColour | KING, enemyColour | QUEEN
+        for j in range(8):
+            offset = rayOffsets[j][0]
+            index = target + offset
+            piece = squares[index]
+            if piece == enemyKing:
+                return True
+            while piece == EMPTY:
+                index += offset
+                piece = squares[index]
+            if piece == enemyQueen or piece == enemyColour | (ROOK if j <= 3 else BISHOP):
                 return True
         return False
 
-    # moves without checks in mind
-    def getAllPossibleMoves(self):
+    # sets inCheck, pins and checks for the side to move, from pinsAndChecks when the caller already found them for this
+    # position with checkForPinsAndChecks. The pins are copied since the piece move functions remove the ones they use
+    def setPinsAndChecks(self, pinsAndChecks=None):
+        if pinsAndChecks is None:
+            pinsAndChecks = self.checkForPinsAndChecks()
+        self.inCheck, pins, self.checks = pinsAndChecks
+        self.pins = list(pins)
+
+    # the legal move with this moveID, or None when there is none. Outside of check only the moves of the piece on the
+    # start square are generated, so the search can try a remembered move before generating the rest
+    def getMoveFromID(self, moveID, pinsAndChecks=None):
+        startRow, startCol = moveID // 1000, moveID // 100 % 10
+        piece = self.board[startRow][startCol]
+        if piece[0] != ('w' if self.whiteToMove else 'b'):
+            return None
+        self.setPinsAndChecks(pinsAndChecks)
+        if self.inCheck:
+            candidates = self.getValidMoves()
+        else:
+            candidates = []
+            self.moveFunctions[piece[1]](startRow, startCol, candidates)
+            if piece[1] == 'K':
+                self.getCastleMoves(startRow, startCol, candidates)
+        for candidate in candidates:
+            if candidate.moveID == moveID:
+                return candidate
+        return None
+
+    # legal captures only, used by the quiescence search so it does not have to generate every move at the leaves.
+    # When in check every legal move is returned instead, since the search has to look at all the evasions
+    def getCaptureMoves(self, pinsAndChecks=None):
+        self.setPinsAndChecks(pinsAndChecks)
+        if self.inCheck:
+            return self.getValidMoves()
+        return self.getAllPossibleMoves(True, False)
+
+    # legal moves that capture nothing, the rest of the moves after getCaptureMoves. Lets the search generate the
+    # quiet moves only once the captures failed to cut off
+    def getQuietMoves(self, pinsAndChecks=None):
+        self.setPinsAndChecks(pinsAndChecks)
+        if self.inCheck:
+            return [m for m in self.getValidMoves() if m.pieceCaptured == "--"]
+        moves = self.getAllPossibleMoves(False, True)
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        self.getCastleMoves(kingRow, kingCol, moves)
+        return moves
+
+    # moves without checks in mind. captures and quiets pick the moves onto enemy pieces (en passant included) and the
+    # moves onto empty squares, the piece move functions below all take the same two flags
+    def getAllPossibleMoves(self, captures=True, quiets=True):
         moves = []  # empty list to add moves to, used as parameters in other subroutines
-        for r in range(len(self.board)):  # number of rows
-            for c in range(len(self.board[r])):  # number of columns in a given row
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)  # calls function based on piece type
+        allyColour = 'w' if self.whiteToMove else 'b'
+        moveFunctions = self.moveFunctions
+        for r, row in enumerate(self.board):
+            for c, piece in enumerate(row):
+                if piece[0] == allyColour:
+                    moveFunctions[piece[1]](r, c, moves, captures, quiets)  # calls function based on piece type
         return moves
 
     def checkForPinsAndChecks(self):
         pins = []
         checks = []
         inCheck = False
+        squares = self.squares
         if self.whiteToMove:
-            enemyColor = 'b'
-            allyColor = 'w'
+            enemyColor = BLACK
+            allyColor = WHITE
             startRow = self.whiteKingLocation[0]
             startCol = self.whiteKingLocation[1]
+            pawnDirections = (4, 5)  # a black pawn checks from the two diagonals above the king
         else:
-            enemyColor = 'w'
-            allyColor = 'b'
+            enemyColor = WHITE
+            allyColor = BLACK
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
-            # check outward from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+            pawnDirections = (6, 7)
+        kingIndex = 21 + startRow * 10 + startCol
+        allyKing = allyColor | KING
+        # check outward from king for pins and checks, keep track of pins
+        for j in range(8):
+            offset, d = rayOffsets[j]
             possiblePin = ()  # reset possible pins
+            index = kingIndex
             for i in range(1, 8):
-                endRow = startRow + (d[0] * i)
-                endCol = startCol + (d[1] * i)
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != "K":
-                        if possiblePin == ():  # list allied piece could be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else:  # 2nd allied piece, so no pin or check possible in this direction
-                            break
-                    elif endPiece[0] == enemyColor:
-                        enemyType = endPiece[1]
-                        # 5 possibilities here in this complex conditional:
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king (this is necessary to
-                        # prevent a king move to a square controlled by another king)
-                        if (0 <= j <= 3 and enemyType == 'R') or (4 <= j <= 7 and enemyType == 'B') or (
-                                i == 1 and enemyType == 'P' and (
-                                (enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or (
-                                enemyType == 'Q') or (i == 1 and enemyType == 'K'):
-                            if possiblePin == ():  # no piece blocking, so check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pins.append(possiblePin)
-                                break
-                        else:  # enemy piece not applying check:
-                            break
+                index += offset
+                endPiece = squares[index]
+                if endPiece == EMPTY or endPiece == allyKing:  # the king itself may be moved off this square
+                    continue
+                if endPiece == OFFBOARD:
+                    break
+                if endPiece & allyColor:
+                    if possiblePin == ():  # list allied piece could be pinned
+                        possiblePin = (startRow + d[0] * i, startCol + d[1] * i, d[0], d[1])
+                    else:  # 2nd allied piece, so no pin or check possible in this direction
+                        break
                 else:
-                    break  # off board
+                    enemyType = endPiece & PIECETYPE
+                    # 5 possibilities here in this complex conditional:
+                    # 1.) orthogonally away from king and piece is a rook
+                    # 2.) diagonally away from king and piece is a bishop
+                    # 3.) 1 square away diagonally from king and piece is a pawn
+                    # 4.) any direction and piece is a queen
+                    # 5.) any direction 1 square away and piece is a king (this is necessary to
+                    # prevent a king move to a square controlled by another king)
+                    if (j <= 3 and enemyType == ROOK) or (j >= 4 and enemyType == BISHOP) or (
+                            i == 1 and enemyType == PAWN and j in pawnDirections) or (
+                            enemyType == QUEEN) or (i == 1 and enemyType == KING):
+                        if possiblePin == ():  # no piece blocking, so check
+                            inCheck = True
+                            checks.append((startRow + d[0] * i, startCol + d[1] * i, d[0], d[1]))
+                        else:  # piece blocking so pin
+                            pins.append(possiblePin)
+                    break  # enemy piece ends the ray whether it gives check or not
         # check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (2, 1), (2, -1), (1, 2), (-1, -2), (1, -2), (-1, 2))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N':  # enemy knight attacking king
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        enemyKnight = enemyColor | KNIGHT
+        for offset, m in knightOffsets:
+            if squares[kingIndex + offset] == enemyKnight:  # enemy knight attacking king
+                inCheck = True
+                checks.append((startRow + m[0], startCol + m[1], m[0], m[1]))
         return inCheck, pins, checks
 
     # get all pawn moves for pawn located at row, col and add those moves to the list
-    def getPawnMoves(self, r, c, moves):
+    def getPawnMoves(self, r, c, moves, captures=True, quiets=True):
         piecePinned = False
         pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
+        for i in range(len(self.pins) - 1, -1, -1) if self.pins else ():
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piecePinned = True
                 pinDirection = (self.pins[i][2], self.pins[i][3])
@@ -381,18 +822,21 @@ class Gamestate:
             startRow = 1
             enemyColor = "w"
             kingRow, kingCol = self.blackKingLocation
+        board = self.board
+        endRow = r + moveAmount
+        epPossible = self.enpassantPossible
 
-        if self.board[r + moveAmount][c] == "--":  # 1 square pawn forward
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                moves.append(move((r, c), (r + moveAmount, c), self.board))
-                if r == startRow and self.board[r + 2 * moveAmount][c] == "--":  # 2 square pawn forward
-                    moves.append(move((r, c), (r + 2 * moveAmount, c), self.board))
+        if quiets and board[endRow][c] == "--":  # 1 square pawn forward
+            if not piecePinned or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0):
+                moves.append(move((r, c), (endRow, c), board))
+                if r == startRow and board[endRow + moveAmount][c] == "--":  # 2 square pawn forward
+                    moves.append(move((r, c), (endRow + moveAmount, c), board))
 
-        if c - 1 >= 0:  # Captures to the left
+        if captures and c - 1 >= 0:  # Captures to the left
             if not piecePinned or pinDirection == (moveAmount, - 1):  # enemy piece to capture
-                if self.board[r + moveAmount][c - 1][0] == enemyColor:
-                    moves.append(move((r, c), (r + moveAmount, c - 1), self.board))
-                if (r + moveAmount, c - 1) == self.enpassantPossible:
+                if board[endRow][c - 1][0] == enemyColor:
+                    moves.append(move((r, c), (endRow, c - 1), board))
+                if epPossible and epPossible == (endRow, c - 1):
                     attackingPiece = blockingPiece = False
                     if kingRow == r:
                         if kingCol < c:  # king is left of the pawn
@@ -410,17 +854,19 @@ class Gamestate:
                             square = self.board[r][i]
                             if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):  # attacking Piece
                                 attackingPiece = True
+                                break
                             elif square != "--":
                                 blockingPiece = True
+                                break  # only the first piece past the pawns matters
                     if not attackingPiece or blockingPiece:
                         moves.append(move((r, c), (r + moveAmount, c - 1), self.board,
                                           isEnPassantMove=True))  # in this case True, bet defaults to False
 
-        if c + 1 <= 7:  # captures to the right
+        if captures and c + 1 <= 7:  # captures to the right
             if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[r + moveAmount][c + 1][0] == enemyColor:
-                    moves.append(move((r, c), (r + moveAmount, c + 1), self.board))
-                if (r + moveAmount, c + 1) == self.enpassantPossible:
+                if board[endRow][c + 1][0] == enemyColor:
+                    moves.append(move((r, c), (endRow, c + 1), board))
+                if epPossible and epPossible == (endRow, c + 1):
                     attackingPiece = blockingPiece = False
                     if kingRow == r:
                         if kingCol < c:  # king is left of the pawn
@@ -438,15 +884,17 @@ class Gamestate:
                             square = self.board[r][i]
                             if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
                                 attackingPiece = True
+                                break
                             elif square != "--":
                                 blockingPiece = True
+                                break
                     if not attackingPiece or blockingPiece:
                         moves.append(
                             move((r, c), (r + moveAmount, c + 1), self.board, isEnPassantMove=True))  # in this case
                         # True, but defaults to False
 
     # get all rook moves for rook located at row, col and add those moves to the list
-    def getRookMoves(self, r, c, moves):
+    def getRookMoves(self, r, c, moves, captures=True, quiets=True):
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -456,46 +904,27 @@ class Gamestate:
                 if self.board[r][c][1] != 'Q':
                     self.pins.remove(self.pins[i])
                 break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # Ally piece invalid
-                            break
-                else:  # off board
-                    break
+        self.getSliderMoves(r, c, rookRays[r][c], piecePinned, pinDirection, moves, captures, quiets)
 
     # get all Knight moves for rook located at row, col and add those moves to the list
-    def getKnightMoves(self, r, c, moves):
+    def getKnightMoves(self, r, c, moves, captures=True, quiets=True):
         piecePinned = False
         for i in range(len(self.pins) - 1, -1, -1):
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piecePinned = True
                 self.pins.remove(self.pins[i])
                 break
-        knightMoves = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, -2), (1, 2), (-1, 2), (-1, -2))
+        if piecePinned:  # a pinned knight can never move
+            return
         allyColor = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:  # not an Ally piece (empty or enemy piece)
-                        moves.append(move((r, c), (endRow, endCol), self.board))
+        board = self.board
+        for endSq in knightDestinations[r][c]:
+            endPiece = board[endSq[0]][endSq[1]]
+            if quiets if endPiece == "--" else captures and endPiece[0] != allyColor:  # empty, or an enemy piece
+                moves.append(move((r, c), endSq, board))
 
     # get all Bishop moves for rook located at row, col and add those moves to the list
-    def getBishopMoves(self, r, c, moves):
+    def getBishopMoves(self, r, c, moves, captures=True, quiets=True):
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -503,53 +932,88 @@ class Gamestate:
                 piecePinned = True
                 pinDirection = (self.pins[i][2], self.pins[i][3])
                 break
+        self.getSliderMoves(r, c, bishopRays[r][c], piecePinned, pinDirection, moves, captures, quiets)
 
-        directions = ((-1, -1), (-1, 1), (1, 1), (1, -1))  # 4 diagonals
+    # walks the precomputed rays of a rook or bishop, a pinned piece may only move along the pin
+    def getSliderMoves(self, r, c, rays, piecePinned, pinDirection, moves, captures=True, quiets=True):
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):  # Bishop can move maximum of 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:  # On board check
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # Ally piece invalid
-                            break
-                else:  # off board
+        board = self.board
+        startSq = (r, c)
+        for d, reverse, ray in rays:
+            if piecePinned and pinDirection != d and pinDirection != reverse:
+                continue
+            for endSq in ray:
+                endPiece = board[endSq[0]][endSq[1]]
+                if endPiece == "--":
+                    if quiets:
+                        moves.append(move(startSq, endSq, board))
+                elif endPiece[0] == enemyColor:
+                    if captures:
+                        moves.append(move(startSq, endSq, board))
+                    break
+                else:  # Ally piece invalid
                     break
 
     # get all Queen moves for rook located at row, col and add those moves to the list
-    def getQueenMoves(self, r, c, moves):
-        self.getBishopMoves(r, c, moves)
-        self.getRookMoves(r, c, moves)
-
-    # get all King moves for rook located at row, col and add those moves to the list
-    def getKingMoves(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        allyColour = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColour:
-                    if allyColour == "w":
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(move((r, c), (endRow, endCol), self.board))
-                    if allyColour == "w":
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
+    def getQueenMoves(self, r, c, moves, captures=True, quiets=True):
+        self.getBishopMoves(r, c, moves, captures, quiets)
+        self.getRookMoves(r, c, moves, captures, quiets)
+
+    # get all King moves for the king located at row, col and add those moves to the list. Out of check no enemy slider
+    # sees through the king's square onto the squares next to it, so each destination can be tested on its own
+    def getKingMoves(self, r, c, moves, captures=True, quiets=True):
+        squares = self.squares
+        allyColour = WHITE if self.whiteToMove else BLACK
+        start = 21 + r * 10 + c
+        destinations = []
+        for offset, d in rayOffsets:
+            target = squares[start + offset]
+            if quiets if target == EMPTY else captures and not target & (allyColour | OFFBOARD):
+                destinations.append((offset, d))
+        if not destinations:  # boxed in by its own pieces, no need to look at the enemy
+            return
+        if self.inCheck:
+            attacked = self.getEnemyAttacks()  # one scan of the enemy pieces covers every destination
+            for offset, d in destinations:
+                if not attacked[start + offset]:
+                    moves.append(move((r, c), (r + d[0], c + d[1]), self.board))
+        else:
+            for offset, d in destinations:
+                if not self.squareUnderAttack(r + d[0], c + d[1]):
+                    moves.append(move((r, c), (r + d[0], c + d[1]), self.board))
+
+    # flags (indexed like squares) of every square the enemy attacks. The side to move's king is treated as empty so
+    # the square behind it on a checking ray counts as attacked, since the king cannot step back along the ray
+    def getEnemyAttacks(self):
+        squares = self.squares
+        if self.whiteToMove:
+            enemyColour, allyKing, pawnOffsets = BLACK, WHITE | KING, (9, 11)
+        else:
+            enemyColour, allyKing, pawnOffsets = WHITE, BLACK | KING, (-11, -9)
+        attacked = bytearray(120)
+        for index in boardIndices:
+            piece = squares[index]
+            if not piece & enemyColour:
+                continue
+            pieceType = piece & PIECETYPE
+            if pieceType == PAWN:
+                for offset in pawnOffsets:
+                    attacked[index + offset] = 1
+            elif pieceType == KNIGHT:
+                for offset, _ in knightOffsets:
+                    attacked[index + offset] = 1
+            elif pieceType == KING:
+                for offset, _ in rayOffsets:
+                    attacked[index + offset] = 1
+            else:
+                for offset in sliderOffsets[pieceType]:
+                    target = index + offset
+                    while True:
+                        attacked[target] = 1
+                        if squares[target] != EMPTY and squares[target] != allyKing:
+                            break
+                        target += offset
+        return attacked
 
     '''
    Generate all valid castle moves for the king at (r,c) and add them to the list of moves
@@ -582,6 +1046,7 @@ class Gamestate:
                 moves.append(move((r, c), (r, c - 2), self.board, isCastleMove=True))
 
     def playSoundEffects(self):
+        import pygame as p  # only the windowed game plays sounds, so the engine itself never loads pygame
         MoveMusicFile = r"C:\Users\Mea\Downloads\moveself.mp3"
         CaptureMusicFile = r"C:\Users\Mea\Downloads\capture.mp3"
         if len(self.moveLog) >= 1:
@@ -610,29 +1075,32 @@ class move:
     filesToCols = {"A": 0, "B": 1, "C": 2, "D": 3, "E": 4, "F": 5, "G": 6, "H": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
+    # fixed attribute slots instead of a per-object __dict__, thousands of moves are built for every node searched
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "moveID",
+                 "isPawnPromotion", "isEnpassantMove", "isCastleMove", "isCapture")
+
     def __init__(self, startSq, endSq, board, isEnPassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        self.startRow = startRow = startSq[0]
+        self.startCol = startCol = startSq[1]
+        self.endRow = endRow = endSq[0]
+        self.endCol = endCol = endSq[1]
+        self.pieceMoved = pieceMoved = board[startRow][startCol]
+        # the search keys its tables (transposition, killers, history) on this int rather than on move objects
+        self.moveID = startRow * 1000 + startCol * 100 + endRow * 10 + endCol
         # Pawn Promotion
-        self.isPawnPromotion = False
-        if (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7):
-            self.isPawnPromotion = True
-        # En Passant
+        self.isPawnPromotion = (pieceMoved == 'wP' and endRow == 0) or (pieceMoved == 'bP' and endRow == 7)
+        # En Passant, optionally passed in as the en passant square instead of True
+        if isEnPassantMove is not True and isEnPassantMove:
+            isEnPassantMove = pieceMoved[1] == "P" and (endRow, endCol) == isEnPassantMove
         self.isEnpassantMove = isEnPassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = 'wP' if self.pieceMoved == 'bP' else 'bP'
-        # optional parameter, not every move should be passed in
-        if self.pieceMoved[1] == "P" and ((self.endRow, self.endCol) == isEnPassantMove):
-            self.isEnpassantMove = True
+        if isEnPassantMove:
+            self.pieceCaptured = 'wP' if pieceMoved == 'bP' else 'bP'
+            self.isCapture = True
+        else:
+            self.pieceCaptured = pieceCaptured = board[endRow][endCol]
+            self.isCapture = pieceCaptured != "--"
         # castle move
         self.isCastleMove = isCastleMove
-        self.isCapture = self.pieceCaptured != "--"
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
 
     # Overriding the equals method
     def __eq__(self, other):
@@ -672,3 +1140,11 @@ class move:
             moveString += "x"
         return moveString + endSquare
 
+
+# a game of the backend named by gamestateBackend. The search, its worker processes and every front end build their
+# games through this, so the backend is chosen in one place
+def newGamestate(fen=None):
+    if gamestateBackend == "bitboard":
+        from Chess.Bitboard import BitboardGamestate  # Bitboard imports this module, so it is loaded on first use
+        return BitboardGamestate(fen)
+    return Gamestate(fen)
@@ -4,8 +4,7 @@ displaying the current GameState object
 """
 import pygame as p
 import sys
-from Chess import ChessEngine, AI
-from multiprocessing import Process, Queue
+from Chess import ChessEngine, AI, EngineWorker
 import os
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'  # Stops Pygame Welcome Message from popping up after every AI move
@@ -39,6 +38,7 @@ if len(sys.argv) > 1:
     HighlightSquaresUI = int(sys.argv[4])
     soundEffects = int(sys.argv[5])
     BoardColour = int(sys.argv[6])
+    AI.setEasyMode(EasyDepthUI == "ON")
 
 
 def loadimages():
@@ -53,13 +53,13 @@ The main driver for our code. This will handle user input and updating the graph
 
 
 def main():
-    global playerOne, playerTwo, returnQueue
+    global playerOne, playerTwo
     p.init()
     screen = p.display.set_mode((boardWidth + moveLogPanelWidth, boardHeight))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     moveLogFont = p.font.SysFont("Times New Roman", 14, False, False)
-    gs = ChessEngine.Gamestate()
+    gs = ChessEngine.newGamestate()
     validMoves = gs.getValidMoves()
     moveMade = False  # flag variable for when a move is made
     animate = False  # flag variable for when we should animate a move
@@ -69,8 +69,11 @@ def main():
     playerClicks = []  # keep track of player clicks (two tuples: [(6, 4), (4, 4)])
     gameOver = False
     AIThinking = False
-    AIProcess = None
+    AIWorker = None  # started once when a side is played by the AI, keeps its tables warm between moves
+    if playerOne != 0 or playerTwo != 0:
+        AIWorker = EngineWorker.EngineWorker(AI.searchProcesses)
     moveUndone = False
+    AIMoved = False  # the last move was the AI's, so the human's reply can be pondered
     while running:
         isHuman = (gs.whiteToMove and playerOne == 0) or (not gs.whiteToMove and playerTwo == 0)
         if (playerOne == 0 and playerTwo == 1) or (playerOne == 1 and playerTwo == 0):
@@ -115,39 +118,41 @@ def main():
                     moveMade = True
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        AIProcess.terminate()
-                        AIThinking = False
+                    if AIWorker is not None:
+                        AIWorker.stop()  # also ends pondering
+                    AIThinking = False
                     moveUndone = True
                 if e.key == p.K_r:
-                    gs = ChessEngine.Gamestate()
+                    gs = ChessEngine.newGamestate()
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = False
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        AIProcess.terminate()
-                        AIThinking = False
+                    if AIWorker is not None:
+                        AIWorker.stop()  # also ends pondering
+                    AIThinking = False
                     moveUndone = True
 
         # AI move finder
         if not gameOver and not isHuman and (not moveUndone or ((playerOne and playerTwo) == 1)):
             if not AIThinking:
                 AIThinking = True
-                returnQueue = Queue()  # used to pass data between threads
-                AIProcess = Process(target=AI.initialiseNegaMaxAlphaBeta, args=(gs, validMoves, returnQueue))
-                AIProcess.start()  # Call AI.initialiseNegaMaxAlphaBeta(gs, validMoves, returnQueue)
+                AIWorker.requestMove(gs, validMoves)  # sends only the moves played since the last request
 
-            if not AIProcess.is_alive():  # checking if thread is still alive
-                AIMove = returnQueue.get()
+            if AIWorker.poll():  # checking if the search has finished
+                AIMove = None
+                for move in validMoves:
+                    if move.moveID == AIWorker.bestMoveID:
+                        AIMove = move
                 if AIMove is None:
                     AIMove = AI.findRandomMove(validMoves)
                 gs.makeMove(AIMove)
                 moveMade = True
                 animate = True
                 AIThinking = False
+                AIMoved = True
 
         if moveMade:
             if animate:
@@ -155,9 +160,14 @@ def main():
             if soundEffects == 1:
                 gs.playSoundEffects()
             validMoves = gs.getValidMoves()
+            humanToMove = (gs.whiteToMove and playerOne == 0) or (not gs.whiteToMove and playerTwo == 0)
+            if AIMoved and AI.pondering and humanToMove and validMoves and \
+                    not (gs.threeMoveDrawRule or gs.fiftyMoveDrawRule):
+                AIWorker.ponder(gs)  # searches on the human's time, requestMove picks it up if they play the guess
             moveMade = False
             animate = False
             moveUndone = False
+            AIMoved = False
 
         drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
 
@@ -180,6 +190,9 @@ def main():
         clock.tick(max_fps)
         p.display.flip()
 
+    if AIWorker is not None:
+        AIWorker.close()
+
 
 '''
 responsible for all the graphics within a current GameState
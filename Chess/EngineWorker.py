@@ -0,0 +1,209 @@
+"""
+Long-lived AI processes for ChessMain. They are started once per game instead of once per AI move, so nothing is
+re-imported or re-allocated between moves and each process keeps its transposition table and history scores warm.
+Every process holds its own copy of the game, a request only carries the moves played (or taken back) since the last
+one rather than a pickled Gamestate (plus the snapshot of the starting position when the game starts from a new one),
+and the root moves are dealt round robin across the processes, each searching its share with AI.iterativeDeepening.
+
+While the human thinks, ponder() searches the position after the reply the last search expected from them. If they
+play it the running search simply becomes the AI's search for the move, otherwise it is stopped and a normal one
+started, which still finds the tables warm from pondering.
+"""
+import queue
+import random
+import time
+from multiprocessing import Process, Queue, Event
+from Chess import ChessEngine, AI
+
+
+# body of every worker process: keeps its Gamestate in step with the game and searches its share of the root moves
+def runWorker(requests, replies, stopEvent):
+    AI.stopEvent = stopEvent
+    gs = ChessEngine.newGamestate()
+    while True:
+        request = requests.get()
+        if request[0] == "quit":
+            break
+        _, requestID, startSnapshot, takeBack, newMoveIDs, rootMoveIDs, timeLimit, depthLimit = request
+        if startSnapshot is not None:  # a new game, e.g. one set up from a FEN
+            gs.restoreSnapshot(startSnapshot)
+        for _ in range(takeBack):
+            gs.undoMove()
+        for moveID in newMoveIDs:
+            for move in gs.getValidMoves():
+                if move.moveID == moveID:
+                    gs.makeMove(move)
+                    break
+        results = []
+        AI.nodesSearched = 0
+        if rootMoveIDs:
+            moves = {move.moveID: move for move in gs.getValidMoves()}
+            rootMoves = [moves[moveID] for moveID in rootMoveIDs if moveID in moves]  # keeps the dealt order
+            results = AI.iterativeDeepening(gs, rootMoves, timeLimit, depthLimit)
+        # the human's expected reply to each best move, the move to ponder on if it is played
+        ponderMoveIDs = {move.moveID: AI.expectedReply(gs, move) for _, _, move in results if move is not None}
+        replies.put((requestID, AI.nodesSearched,
+                     [(depth, score, move.moveID if move else None) for depth, score, move in results], ponderMoveIDs))
+
+
+# how many moves two games share from the start
+def commonPrefix(moveIDs, otherMoveIDs):
+    common = 0
+    while common < min(len(moveIDs), len(otherMoveIDs)) and moveIDs[common] == otherMoveIDs[common]:
+        common += 1
+    return common
+
+
+class EngineWorker:
+    def __init__(self, processes=1):
+        self.stopEvent = Event()  # shared by every worker, set to end the current search early
+        self.replies = Queue()
+        self.requestQueues = [Queue() for _ in range(max(1, processes))]
+        self.processes = [Process(target=runWorker, args=(requests, self.replies, self.stopEvent), daemon=True)
+                          for requests in self.requestQueues]
+        for process in self.processes:
+            process.start()
+        self.syncedStartSnapshot = None  # starting position of the game the workers are in step with, None before any
+        self.syncedMoveIDs = []  # moveIDs of the game the workers are currently in step with
+        self.mirror = ChessEngine.newGamestate()  # copy of the game, used to find the moves of a pondered position
+        self.mirrorMoveIDs = []
+        self.requestID = 0
+        self.pendingReplies = 0  # workers yet to answer the current request
+        self.shareResults = []
+        self.ponderMoveIDs = {}  # best moveID: the reply the workers expect to it
+        self.bestMoveID = None
+        self.ponderMoveID = None  # the expected reply to bestMoveID, if the workers had one
+        self.nodesSearched = 0
+        self.depthReached = 0
+        self.ponderedMoveIDs = None  # the game the running search is pondering, None when it is a normal search
+        self.ponderStartTime = 0
+        self.stopTime = None  # when poll() ends a ponder search that turned into the real one
+
+    # starts a search of gs in the background, poll() tells when it is done
+    def requestMove(self, gs, validMoves, timeLimit=None, depthLimit=None):
+        timeLimit = AI.timeLimit if timeLimit is None else timeLimit
+        depthLimit = AI.depthLimit if depthLimit is None else depthLimit  # read now, setEasyMode may have changed it
+        moveIDs = [move.moveID for move in gs.moveLog]
+        if self.ponderedMoveIDs is not None:
+            ponderHit = moveIDs == self.ponderedMoveIDs
+            self.ponderedMoveIDs = None
+            if ponderHit:  # keep the running search, it only gets what is left of the time it would have had
+                self.stopTime = time.time() + max(0, timeLimit - (time.time() - self.ponderStartTime))
+                return
+        self.waitForWorkers()
+        bookMove = AI.openingBook.pickMove(gs, validMoves)
+        if bookMove is not None:  # answered straight away, the workers catch up with the game on the next request
+            self.bestMoveID = bookMove.moveID
+            self.ponderMoveID = None
+            self.depthReached = 0
+            self.nodesSearched = 0
+            return
+        self.startSearch(gs.startSnapshot, moveIDs, validMoves, timeLimit, depthLimit)
+
+    # searches the position after the expected reply to the AI's last move until the human has moved
+    def ponder(self, gs, timeLimit=None, depthLimit=None):
+        timeLimit = AI.ponderTimeLimit if timeLimit is None else timeLimit
+        depthLimit = AI.depthLimit if depthLimit is None else depthLimit
+        ponderMoveID = self.ponderMoveID
+        self.ponderMoveID = None
+        if ponderMoveID is None:
+            return
+        self.waitForWorkers()
+        moveIDs = [move.moveID for move in gs.moveLog]
+        self.syncMirror(gs.startSnapshot, moveIDs)
+        ponderMove = self.mirror.getMoveFromID(ponderMoveID)
+        if ponderMove is None:
+            return
+        self.mirror.makeMove(ponderMove)
+        validMoves = self.mirror.getValidMoves()
+        gameOver = not validMoves or self.mirror.threeMoveDrawRule or self.mirror.fiftyMoveDrawRule
+        self.mirror.undoMove()
+        if gameOver:
+            return
+        self.startSearch(gs.startSnapshot, moveIDs + [ponderMoveID], validMoves, timeLimit, depthLimit)
+        self.ponderedMoveIDs = moveIDs + [ponderMoveID]
+        self.ponderStartTime = time.time()
+
+    # stops whatever the workers are running and waits until they are free for a new request
+    def waitForWorkers(self):
+        self.ponderedMoveIDs = None
+        self.stopTime = None
+        if self.pendingReplies:
+            self.stop()
+            while self.pendingReplies:
+                if self.replies.get()[0] == self.requestID:
+                    self.pendingReplies -= 1
+        self.stopEvent.clear()
+
+    # plays the mirror back to the last move it shares with moveIDs, then forward
+    def syncMirror(self, startSnapshot, moveIDs):
+        if startSnapshot != self.mirror.startSnapshot:
+            self.mirror.restoreSnapshot(startSnapshot)
+            self.mirrorMoveIDs = []
+        common = commonPrefix(moveIDs, self.mirrorMoveIDs)
+        for _ in range(len(self.mirrorMoveIDs) - common):
+            self.mirror.undoMove()
+        for moveID in moveIDs[common:]:
+            self.mirror.makeMove(self.mirror.getMoveFromID(moveID))
+        self.mirrorMoveIDs = list(moveIDs)
+
+    def startSearch(self, startSnapshot, moveIDs, validMoves, timeLimit, depthLimit):
+        # only send what changed: undo back to the last move both games share, then replay the rest
+        newStartSnapshot = None
+        if startSnapshot != self.syncedStartSnapshot:  # a different game, the workers replay it from its start
+            newStartSnapshot = self.syncedStartSnapshot = startSnapshot
+            self.syncedMoveIDs = []
+        common = commonPrefix(moveIDs, self.syncedMoveIDs)
+        takeBack = len(self.syncedMoveIDs) - common
+        newMoveIDs = moveIDs[common:]
+        self.syncedMoveIDs = list(moveIDs)
+
+        rootMoves = list(validMoves)
+        random.shuffle(rootMoves)  # variety between equal moves
+        AI.orderMoves(rootMoves, None, 0)
+        shares = min(len(self.processes), len(rootMoves))
+        self.requestID += 1
+        for i, requests in enumerate(self.requestQueues):  # workers without a share still replay the moves
+            rootMoveIDs = [move.moveID for move in rootMoves[i::shares]] if i < shares else []
+            requests.put(("search", self.requestID, newStartSnapshot, takeBack, newMoveIDs, rootMoveIDs, timeLimit,
+                          depthLimit))
+        self.pendingReplies = len(self.requestQueues)
+        self.shareResults = []
+        self.ponderMoveIDs = {}
+        self.bestMoveID = None
+        self.ponderMoveID = None
+        self.nodesSearched = 0
+
+    # True once every worker has answered the last request, the chosen move is then in bestMoveID
+    def poll(self):
+        if self.stopTime is not None and time.time() >= self.stopTime:
+            self.stopTime = None
+            self.stop()
+        while self.pendingReplies:
+            try:
+                requestID, nodes, results, ponderMoveIDs = self.replies.get_nowait()
+            except queue.Empty:
+                return False
+            if requestID != self.requestID:  # left over from a stopped request
+                continue
+            self.pendingReplies -= 1
+            self.nodesSearched += nodes
+            self.shareResults.append(results)
+            self.ponderMoveIDs.update(ponderMoveIDs)
+            if self.pendingReplies == 0:
+                self.stopTime = None
+                self.depthReached, self.bestMoveID = AI.pickParallelResult(self.shareResults)
+                self.ponderMoveID = self.ponderMoveIDs.get(self.bestMoveID)
+        return True
+
+    # ends the current search early, its answer is thrown away by the next requestMove or ponder
+    def stop(self):
+        self.ponderedMoveIDs = None
+        self.stopEvent.set()
+
+    def close(self):
+        self.stop()
+        for requests in self.requestQueues:
+            requests.put(("quit",))
+        for process in self.processes:
+            process.join(timeout=1)
@@ -0,0 +1,77 @@
+"""
+Material and piece-square scores used to evaluate a position. The tables are baked into one flat 64-entry list per
+piece when the module loads, so Gamestate can keep a running score and only add or subtract the squares a move changes.
+"""
+pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}  # Dictionary assigns value to each respective piece type
+
+#  knight is generally better in centre than corners
+#  helping AI develop positional awareness
+
+knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
+                [1, 2, 2, 2, 2, 2, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 2, 2, 2, 2, 2, 1],
+                [1, 1, 1, 1, 1, 1, 1, 1]]
+
+BishopScores = [[0, 2, 2, 2, 2, 2, 2, 0],
+                [2, 4, 4, 4, 4, 4, 4, 2],
+                [2, 4, 5, 6, 6, 5, 4, 2],
+                [2, 5, 5, 6, 6, 5, 5, 2],
+                [2, 4, 6, 6, 6, 6, 4, 2],
+                [2, 6, 6, 6, 6, 6, 6, 2],
+                [2, 5, 4, 4, 4, 4, 5, 2],
+                [0, 2, 2, 2, 2, 2, 2, 0]]
+
+RookScores = [[2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5],
+              [5, 7.5, 7.5, 7.5, 7.5, 7.5, 7.5, 5],
+              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
+              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
+              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
+              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
+              [0, 2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 0],
+              [4, 2.5, 2.5, 5, 5, 2.5, 2.5, 4]]
+
+QueenScores = [[0, 2, 2, 3, 3, 2, 2, 0],
+               [2, 4, 4, 4, 4, 4, 4, 2],
+               [2, 4, 5, 5, 5, 5, 4, 2],
+               [3, 4, 5, 5, 5, 5, 4, 3],
+               [4, 4, 5, 5, 5, 5, 4, 3],
+               [2, 5, 5, 5, 5, 5, 4, 2],
+               [2, 4, 5, 4, 4, 4, 4, 2],
+               [0, 2, 2, 3, 3, 2, 2, 0]]
+
+PawnScores = [[8, 8, 8, 8, 8, 8, 8, 8],
+              [7, 7, 7, 7, 7, 7, 7, 7],
+              [3, 3, 4, 5, 5, 4, 3, 3],
+              [2.5, 2.5, 3, 4.5, 4.5, 3, 2.5, 2.5],
+              [2, 2, 2, 4, 4, 2, 2, 2],
+              [2.5, 1.5, 1, 2, 2, 1, 1.5, 2.5],
+              [2.5, 3, 3, 0, 0, 3, 3, 2.5],
+              [2, 2, 2, 2, 2, 2, 2, 2]]
+
+# [::-1] go through list in reverse order (used for scores from black's perspective
+piecePositionScores = {"wN": knightScores, "bN": knightScores[::-1], "wB": BishopScores, "bB": BishopScores[::-1],
+                       "wQ": QueenScores, "bQ": QueenScores[::-1], "wR": RookScores, "bR": RookScores[::-1],
+                       "wP": PawnScores, "bP": PawnScores[::-1]}
+
+positionWeight = 0.1  # how much a point in the piece-square tables is worth compared to a pawn
+evalScale = 100  # baked scores are whole hundredths of a pawn, so adding and subtracting them never drifts
+
+
+# pieceSquareValues[piece][row * 8 + col] is what that piece on that square adds to the score, positive is good for
+# white, negative is good for black. Kings have no material value and no table, so theirs are all 0
+def bakePieceSquareValues():
+    values = {}
+    for colour, sign in (("w", 1), ("b", -1)):
+        for pieceType in pieceScore:
+            piece = colour + pieceType
+            table = piecePositionScores.get(piece, [[0] * 8 for _ in range(8)])
+            values[piece] = [sign * round((pieceScore[pieceType] + table[r][c] * positionWeight) * evalScale)
+                             for r in range(8) for c in range(8)]
+    return values
+
+
+pieceSquareValues = bakePieceSquareValues()
@@ -0,0 +1,269 @@
+"""
+Self-play match runner: plays two engine settings against each other to find out whether a change is stronger at
+the same thinking time. Games are played without the pygame window across a pool of processes, every opening is played
+twice with the colours swapped, and each finished game is appended to a PGN file straight away. The match stops as
+soon as the SPRT (sequential probability ratio test) decides between "no better than elo0" and "at least elo1".
+
+An engine is a list of AI settings to override, for example timeLimit=0.5,depthLimit=6 or deltaMargin=3, and every
+engine keeps its own transposition table, killer moves and history scores. Run from the folder above Chess:
+    python -m Chess.Match --games 200 --time 0.2 --engine2 deltaMargin=3
+    python -m Chess.Match --games 100 --processes 4 --fens openings.txt --pgn match.pgn --elo1 10
+"""
+import argparse
+import ast
+import math
+import random
+import time
+from multiprocessing import Pool
+from Chess import ChessEngine, AI
+from Chess.TranspositionTable import TranspositionTable
+
+whiteScores = {"1-0": 1, "0-1": 0, "1/2-1/2": 0.5}  # white's score for each PGN result
+files = "abcdefgh"
+
+
+def parseEngine(text):  # "timeLimit=0.5,deltaMargin=3" to {"timeLimit": 0.5, "deltaMargin": 3}
+    settings = {}
+    for setting in filter(None, text.split(",")):
+        name, value = setting.split("=", 1)
+        if not hasattr(AI, name.strip()):
+            raise SystemExit(f"AI has no setting called {name.strip()}")
+        settings[name.strip()] = ast.literal_eval(value.strip())
+    return settings
+
+
+# Standard Algebraic Notation of a move, validMoves are the legal moves of the position it is played in
+def sanMove(move, validMoves):
+    if move.isCastleMove:
+        return "O-O" if move.endCol == 6 else "O-O-O"
+    endSquare = files[move.endCol] + str(8 - move.endRow)
+    pieceType = move.pieceMoved[1]
+    if pieceType == "P":
+        san = (files[move.startCol] + "x" if move.isCapture or move.isEnpassantMove else "") + endSquare
+        return san + "=Q" if move.isPawnPromotion else san
+    # another piece of the same kind that can reach the same square makes the start file, rank or both necessary
+    rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and other.moveID != move.moveID
+              and other.endRow == move.endRow and other.endCol == move.endCol]
+    fromSquare = ""
+    if rivals:
+        if all(other.startCol != move.startCol for other in rivals):
+            fromSquare = files[move.startCol]
+        elif all(other.startRow != move.startRow for other in rivals):
+            fromSquare = str(8 - move.startRow)
+        else:
+            fromSquare = files[move.startCol] + str(8 - move.startRow)
+    return pieceType + fromSquare + ("x" if move.isCapture else "") + endSquare
+
+
+# a random, not yet finished game of plies moves from the start, as moveIDs
+def randomOpening(rng, plies):
+    while True:
+        gs = ChessEngine.newGamestate()
+        moveIDs = []
+        validMoves = gs.getValidMoves()
+        while len(moveIDs) < plies and validMoves:
+            move = rng.choice(validMoves)
+            gs.makeMove(move)
+            moveIDs.append(move.moveID)
+            validMoves = gs.getValidMoves()
+        if validMoves:
+            return moveIDs
+
+
+# per process copy of each engine's search state, so the two engines never share a table or move ordering
+engineStates = {}
+defaultSettings = {}
+
+
+def useEngine(engineIndex, settings):
+    if engineIndex not in engineStates:
+        engineStates[engineIndex] = (TranspositionTable(settings.get("ttSizeMB", AI.ttSizeMB)),
+                                     [[None, None] for _ in range(AI.maxPly)],
+                                     {piece: [0] * 64 for piece in AI.historyScores})
+    AI.transpositionTable, AI.killerMoves, AI.historyScores = engineStates[engineIndex]
+    for name, value in settings.items():
+        defaultSettings.setdefault(name, getattr(AI, name))
+    for name, value in defaultSettings.items():
+        setattr(AI, name, settings.get(name, value))
+
+
+# plays one game in a pool process, returns its result, moves and the search statistics of both engines
+def playGame(job):
+    gameIndex, fen, openingMoveIDs, whiteEngine, engines, timeLimit, maxPlies, backend = job
+    ChessEngine.gamestateBackend = backend
+    gs = ChessEngine.newGamestate(fen)
+    sanMoves = []
+    stats = [{"moves": 0, "nodes": 0, "time": 0.0, "depth": 0, "latencies": []} for _ in engines]
+    validMoves = gs.getValidMoves()
+    for moveID in openingMoveIDs:
+        move = next(move for move in validMoves if move.moveID == moveID)
+        sanMoves.append(sanMove(move, validMoves))
+        gs.makeMove(move)
+        validMoves = gs.getValidMoves()
+    result = None
+    while result is None:
+        engineIndex = whiteEngine if gs.whiteToMove else 1 - whiteEngine
+        useEngine(engineIndex, engines[engineIndex])
+        startTime = time.perf_counter()
+        searchResults = AI.iterativeDeepening(gs, validMoves, AI.timeLimit if "timeLimit" in engines[engineIndex]
+                                              else timeLimit, AI.depthLimit)
+        elapsed = time.perf_counter() - startTime
+        move = searchResults[-1][2] if searchResults and searchResults[-1][2] is not None else \
+            AI.findRandomMove(validMoves)
+        engineStats = stats[engineIndex]
+        engineStats["moves"] += 1
+        engineStats["nodes"] += AI.nodesSearched
+        engineStats["time"] += elapsed
+        engineStats["depth"] += AI.depthReached
+        engineStats["latencies"].append(elapsed)
+        san = sanMove(move, validMoves)
+        gs.makeMove(move)
+        validMoves = gs.getValidMoves()
+        if gs.checkMate:
+            san += "#"
+            result = "0-1" if gs.whiteToMove else "1-0"
+        elif gs.inCheck:
+            san += "+"
+        sanMoves.append(san)
+        if result is None and (gs.staleMate or gs.threeMoveDrawRule or gs.fiftyMoveDrawRule or gs.pieceCount == 2
+                               or len(gs.moveLog) >= maxPlies):
+            result = "1/2-1/2"
+    return {"game": gameIndex, "fen": fen, "whiteEngine": whiteEngine, "result": result, "moves": sanMoves,
+            "stats": stats}
+
+
+def formatPgn(game, names, startFen, firstWhiteToMove):
+    white, black = (names[0], names[1]) if game["whiteEngine"] == 0 else (names[1], names[0])
+    lines = ['[Event "Self-play match"]', '[Site "?"]', f'[Date "{time.strftime("%Y.%m.%d")}"]',
+             f'[Round "{game["game"] + 1}"]', f'[White "{white}"]', f'[Black "{black}"]',
+             f'[Result "{game["result"]}"]']
+    if startFen:
+        lines += ['[SetUp "1"]', f'[FEN "{startFen}"]']
+    lines.append(f'[PlyCount "{len(game["moves"])}"]')
+    words = []
+    moveNumber = int(startFen.split()[5]) if startFen and len(startFen.split()) > 5 else 1
+    whiteToMove = firstWhiteToMove
+    for i, san in enumerate(game["moves"]):
+        if whiteToMove:
+            words.append(f"{moveNumber}. {san}")  # a move number never ends a line
+        elif i == 0:
+            words.append(f"{moveNumber}... {san}")
+        else:
+            words.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    words.append(game["result"])
+    movetext, line = [], ""
+    for word in words:  # PGN lines stay under 80 characters
+        if line and len(line) + 1 + len(word) > 79:
+            movetext.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    movetext.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(movetext) + "\n\n"
+
+
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+# log likelihood ratio of elo1 against elo0 for the scores so far (normal approximation of the game results)
+def sprtLLR(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if wins == 0 or losses == 0:  # the variance is not yet meaningful
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    score0, score1 = expectedScore(elo0), expectedScore(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def printReport(names, record, totals):
+    wins, draws, losses = record
+    games = wins + draws + losses
+    print(f"\n{names[1]} vs {names[0]}: {games} games, +{wins} ={draws} -{losses}", end="")
+    if games:
+        score = (wins + draws / 2) / games
+        if 0 < score < 1:
+            print(f", score {score:.3f}, elo {-400 * math.log10(1 / score - 1):+.1f}", end="")
+    print()
+    for name, total in zip(names, totals):
+        moves = max(total["moves"], 1)
+        latencies = total["latencies"]
+        print(f"{name:<24} {total['nodes'] / max(total['time'], 1e-9):8.0f} nps  depth {total['depth'] / moves:5.2f}  "
+              f"latency ms p50 {percentile(latencies, 0.5) * 1000:6.0f}  p90 {percentile(latencies, 0.9) * 1000:6.0f}  "
+              f"p99 {percentile(latencies, 0.99) * 1000:6.0f}  max {max(latencies, default=0) * 1000:6.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine against engine match with SPRT and PGN output")
+    parser.add_argument("--engine1", default="", help="AI settings of the baseline, e.g. deltaMargin=2")
+    parser.add_argument("--engine2", default="", help="AI settings of the candidate, e.g. deltaMargin=3")
+    parser.add_argument("--games", type=int, default=100, help="most games to play (default 100)")
+    parser.add_argument("--time", type=float, default=0.2, help="seconds per move unless an engine sets timeLimit")
+    parser.add_argument("--processes", type=int, default=AI.searchProcesses, help="games played at once")
+    parser.add_argument("--plies", type=int, default=8, help="random moves at the start of each opening")
+    parser.add_argument("--fens", help="file of opening FENs, one per line, used instead of random openings")
+    parser.add_argument("--maxplies", type=int, default=400, help="games this long are scored as draws")
+    parser.add_argument("--backend", choices=("bitboard", "mailbox"), default=ChessEngine.gamestateBackend,
+                        help="move generator both engines use")
+    parser.add_argument("--pgn", default="match.pgn", help="PGN file the games are appended to")
+    parser.add_argument("--elo0", type=float, default=0, help="SPRT: elo of the null hypothesis")
+    parser.add_argument("--elo1", type=float, default=5, help="SPRT: elo of the alternative hypothesis")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT: false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT: false negative rate")
+    parser.add_argument("--seed", type=int, default=None, help="random seed of the openings")
+    args = parser.parse_args()
+
+    engines = [parseEngine(args.engine1), parseEngine(args.engine2)]
+    names = [args.engine1 or "baseline", args.engine2 or "candidate"]
+    rng = random.Random(args.seed)
+    if args.fens:
+        with open(args.fens) as file:
+            openings = [(line.strip(), []) for line in file if line.strip()]
+        rng.shuffle(openings)
+    else:
+        openings = [(None, randomOpening(rng, args.plies)) for _ in range((args.games + 1) // 2)]
+    jobs = []
+    for gameIndex in range(args.games):  # each opening twice, with the engines' colours swapped
+        fen, openingMoveIDs = openings[gameIndex // 2 % len(openings)]
+        jobs.append((gameIndex, fen, openingMoveIDs, gameIndex % 2, engines, args.time, args.maxplies, args.backend))
+
+    lower, upper = math.log(args.beta / (1 - args.alpha)), math.log((1 - args.beta) / args.alpha)
+    record = [0, 0, 0]  # wins, draws, losses of engine2
+    totals = [{"moves": 0, "nodes": 0, "time": 0.0, "depth": 0, "latencies": []} for _ in engines]
+    decision = None
+    with Pool(max(1, args.processes)) as pool, open(args.pgn, "a") as pgnFile:
+        for game in pool.imap_unordered(playGame, jobs):
+            startFen = game["fen"]
+            pgnFile.write(formatPgn(game, names, startFen, not startFen or startFen.split()[1] == "w"))
+            pgnFile.flush()
+            whiteScore = whiteScores[game["result"]]
+            candidateScore = whiteScore if game["whiteEngine"] == 1 else 1 - whiteScore
+            record[{1: 0, 0.5: 1, 0: 2}[candidateScore]] += 1
+            for total, stats in zip(totals, game["stats"]):
+                for key in ("moves", "nodes", "time", "depth", "latencies"):
+                    total[key] += stats[key]
+            llr = sprtLLR(*record, args.elo0, args.elo1)
+            print(f"game {sum(record):>4}  {game['result']:<7}  +{record[0]} ={record[1]} -{record[2]}  "
+                  f"LLR {llr:+.2f} [{lower:+.2f}, {upper:+.2f}]", flush=True)
+            if llr >= upper or llr <= lower:
+                decision = f"H1 accepted: {names[1]} is at least {args.elo1:g} elo stronger" if llr >= upper else \
+                    f"H0 accepted: {names[1]} is not {args.elo1:g} elo stronger"
+                pool.terminate()
+                break
+    printReport(names, record, totals)
+    print(decision or "SPRT undecided after the last game")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Perft (performance test) for the move generator. perft counts every leaf of the legal move tree to a given depth,
+divide splits that count by root move. Comparing the counts with the published values of the standard reference
+positions catches move generation bugs, and the time taken measures generator throughput.
+
+Run from the folder above Chess:
+    python -m Chess.Perft                           reference suite up to depth 4
+    python -m Chess.Perft --depth 5 --processes 8   deeper, root moves spread across 8 processes
+    python -m Chess.Perft --fen "<fen>" --depth 3 --divide
+"""
+import argparse
+import time
+from multiprocessing import Pool
+from Chess import ChessEngine
+
+# (name, FEN, node counts for depth 1, 2, 3...). The engine only ever promotes to a queen, so the counts stop
+# before the first depth where an underpromotion is possible in the published tables
+referencePositions = [
+    ("Start position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862]),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6]),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890]),
+]
+
+
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)  # every legal move is a leaf, no need to play them
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+# node count below each root move, as (move, nodes) pairs
+def divide(gs, depth):
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move, perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+
+
+def perftRootMove(job):  # runs in a worker process, each worker rebuilds the position from the FEN
+    fen, backend, moveID, depth = job
+    ChessEngine.gamestateBackend = backend  # a spawned worker starts from the module default
+    gs = ChessEngine.newGamestate(fen)
+    for move in gs.getValidMoves():
+        if move.moveID == moveID:
+            gs.makeMove(move)
+            return perft(gs, depth - 1)
+
+
+# divide with the root moves spread across a pool of processes
+def parallelDivide(fen, depth, processes):
+    moves = ChessEngine.newGamestate(fen).getValidMoves()
+    jobs = [(fen, ChessEngine.gamestateBackend, move.moveID, depth) for move in moves]
+    with Pool(processes) as pool:
+        counts = pool.map(perftRootMove, jobs, chunksize=1)
+    return list(zip(moves, counts))
+
+
+def runPerft(fen, depth, processes=1):
+    if processes > 1 and depth > 1:
+        return sum(count for _, count in parallelDivide(fen, depth, processes))
+    return perft(ChessEngine.newGamestate(fen), depth)
+
+
+# runs every reference position up to maxDepth and prints the counts, speed and whether they match
+def runReferenceSuite(maxDepth, processes=1):
+    allPassed = True
+    totalNodes = 0
+    totalTime = 0
+    for name, fen, counts in referencePositions:
+        for depth in range(1, min(maxDepth, len(counts)) + 1):
+            startTime = time.perf_counter()
+            nodes = runPerft(fen, depth, processes)
+            elapsed = time.perf_counter() - startTime
+            totalNodes += nodes
+            totalTime += elapsed
+            passed = nodes == counts[depth - 1]
+            allPassed = allPassed and passed
+            print(f"{name:<16} depth {depth}  nodes {nodes:>10}  expected {counts[depth - 1]:>10}  "
+                  f"{'ok  ' if passed else 'FAIL'}  {elapsed:8.3f}s  {nodes / max(elapsed, 1e-9):>10.0f} nps")
+    print(f"total {totalNodes} nodes in {totalTime:.3f}s, {totalNodes / max(totalTime, 1e-9):.0f} nps, "
+          f"{'all counts match' if allPassed else 'MISMATCH'}")
+    return allPassed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft and divide for the chess move generator")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (default 4)")
+    parser.add_argument("--fen", help="position to count instead of the reference suite")
+    parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes for the root moves")
+    parser.add_argument("--backend", choices=("bitboard", "mailbox"), default=ChessEngine.gamestateBackend,
+                        help=f"move generator to count (default {ChessEngine.gamestateBackend})")
+    args = parser.parse_args()
+    ChessEngine.gamestateBackend = args.backend
+
+    if args.fen is None:
+        raise SystemExit(0 if runReferenceSuite(args.depth, args.processes) else 1)
+
+    startTime = time.perf_counter()
+    if args.divide:
+        if args.processes > 1:
+            results = parallelDivide(args.fen, args.depth, args.processes)
+        else:
+            results = divide(ChessEngine.newGamestate(args.fen), args.depth)
+        for move, count in results:
+            print(f"{move.getChessNotation().lower()}: {count}")
+        nodes = sum(count for _, count in results)
+    else:
+        nodes = runPerft(args.fen, args.depth, args.processes)
+    elapsed = time.perf_counter() - startTime
+    print(f"nodes {nodes}  time {elapsed:.3f}s  {nodes / max(elapsed, 1e-9):.0f} nps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Fixed size transposition table for the AI search. Positions are looked up by their Gamestate.zobristKey, so a position
+reached through a different move order reuses the result of the earlier search instead of searching it again.
+"""
+
+# bound types of a stored score
+EXACT = 0  # score is the true value of the position
+LOWERBOUND = 1  # search failed high (beta cutoff), the true value is at least the score
+UPPERBOUND = 2  # no move raised alpha, the true value is at most the score
+
+# rough size in bytes of one stored entry in CPython: the list slot, the tuple and the integers/floats inside it
+entrySize = 160
+
+
+class TranspositionTable:
+    def __init__(self, sizeMB=16):
+        # every bucket holds two entries, the table is allocated once and never grows so memory stays flat
+        buckets = max(1, (sizeMB * 1024 * 1024) // (entrySize * 2))
+        self.bucketCount = 1 << (buckets.bit_length() - 1)  # power of two, so the index is just key & mask
+        self.mask = self.bucketCount - 1
+        self.depthPreferred = [None] * self.bucketCount  # replaced only by deeper searches or stale entries
+        self.alwaysReplace = [None] * self.bucketCount  # takes everything the depth preferred slot turns down
+        self.generation = 0
+
+    # called at the start of every search so entries left over from earlier moves can be replaced
+    def newSearch(self):
+        self.generation += 1
+
+    def clear(self):
+        self.depthPreferred = [None] * self.bucketCount
+        self.alwaysReplace = [None] * self.bucketCount
+        self.generation = 0
+
+    # returns (key, depth, score, flag, bestMoveID, generation) or None when the position is not stored
+    def probe(self, key):
+        index = key & self.mask
+        entry = self.depthPreferred[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = self.alwaysReplace[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, bestMoveID):
+        index = key & self.mask
+        entry = (key, depth, score, flag, bestMoveID, self.generation)
+        current = self.depthPreferred[index]
+        if current is not None and current[0] == key:
+            if depth >= current[1]:
+                self.depthPreferred[index] = entry
+            else:  # a shallower result (such as a quiescence leaf) keeps the deeper search of the same position
+                self.depthPreferred[index] = current[:5] + (self.generation,)
+        elif current is None or depth >= current[1] or current[5] != self.generation:
+            self.depthPreferred[index] = entry
+        else:
+            self.alwaysReplace[index] = entry
@@ -0,0 +1,160 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can be played from chess GUIs and match managers and run on
+machines without a display. Start it with
+    python -m Chess.UCI
+and talk to it over stdin/stdout. Supported: uci, isready, ucinewgame, position (startpos or fen, then moves),
+go (depth, movetime, wtime/btime/winc/binc/movestogo, infinite), stop and quit.
+
+Nothing here imports pygame, ChessEngine only loads it to play sounds in the windowed game. The search runs on its own
+thread so stop can end it through AI.stopEvent. The engine only promotes to a queen, so any promotion a GUI sends is
+played as one.
+"""
+import sys
+import threading
+import time
+from Chess import ChessEngine, AI
+
+files = "abcdefgh"
+moveOverhead = 0.05  # seconds kept back from every clock move for the GUI and the pipe
+defaultMovesToGo = 30  # moves the remaining clock time is shared across when the GUI does not say
+infiniteTime = 10 ** 6  # time limit of a search that only ends on stop (or at its depth limit)
+
+
+def moveToUci(move):
+    uciMove = files[move.startCol] + str(8 - move.startRow) + files[move.endCol] + str(8 - move.endRow)
+    return uciMove + "q" if move.isPawnPromotion else uciMove
+
+
+def uciToMoveID(uciMove):  # "e2e4" (any promotion letter is dropped) to a moveID
+    startCol, startRow = files.index(uciMove[0]), 8 - int(uciMove[1])
+    endCol, endRow = files.index(uciMove[2]), 8 - int(uciMove[3])
+    return startRow * 1000 + startCol * 100 + endRow * 10 + endCol
+
+
+# the search scores mates as +-CHECKMATE without their distance, but iterative deepening stops at the first depth
+# that finds one, so a mate found at depth plies is a mate in (depth + 1) // 2 moves
+def scoreToUci(score, depth):
+    if score >= AI.CHECKMATE:
+        return f"mate {(depth + 1) // 2}"
+    if score <= -AI.CHECKMATE:
+        return f"mate -{max(1, depth // 2)}"
+    return f"cp {round(score * 100)}"
+
+
+def send(line):
+    print(line, flush=True)
+
+
+class UCIEngine:
+    def __init__(self):
+        self.gs = ChessEngine.newGamestate()
+        self.stopEvent = threading.Event()
+        AI.stopEvent = self.stopEvent
+        self.searchThread = None
+
+    def handle(self, line):  # False once the engine should quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            send("id name ChessAI")
+            send("id author ChessAI")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.gs = ChessEngine.newGamestate()
+            AI.newGame()  # so one game's tables do not steer the next
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.go(tokens[1:])
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        return True
+
+    # position startpos [moves ...] or position fen <fen> [moves ...]
+    def setPosition(self, tokens):
+        moves = tokens.index("moves") if "moves" in tokens else len(tokens)
+        self.gs = ChessEngine.newGamestate(" ".join(tokens[1:moves]) if tokens and tokens[0] == "fen" else None)
+        for uciMove in tokens[moves + 1:]:
+            move = self.gs.getMoveFromID(uciToMoveID(uciMove))
+            if move is None:
+                send("info string illegal move " + uciMove)
+                break
+            self.gs.makeMove(move)
+
+    def go(self, tokens):
+        options = {}
+        for name, value in zip(tokens, tokens[1:]):
+            if name in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                options[name] = int(value)
+        infinite = "infinite" in tokens
+        depthLimit = options.get("depth", AI.depthLimit)
+        clock, increment = ("wtime", "winc") if self.gs.whiteToMove else ("btime", "binc")
+        if infinite or ("depth" in options and "movetime" not in options and clock not in options):
+            timeLimit = infiniteTime
+        elif "movetime" in options:
+            timeLimit = options["movetime"] / 1000
+        elif clock in options:
+            timeLeft = options[clock] / 1000
+            timeLimit = timeLeft / options.get("movestogo", defaultMovesToGo) + options.get(increment, 0) / 1000
+            timeLimit = min(timeLimit, timeLeft / 2)  # never bet most of the clock on one move
+        else:
+            timeLimit = AI.timeLimit
+        timeLimit = max(0.01, timeLimit - moveOverhead)
+        self.stopEvent.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(timeLimit, depthLimit, infinite), daemon=True)
+        self.searchThread.start()
+
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    # runs on the search thread, always ends by sending bestmove
+    def search(self, timeLimit, depthLimit, infinite):
+        gs = self.gs
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            send("bestmove 0000")
+            return
+        bestMove = AI.openingBook.pickMove(gs, validMoves)
+        if bestMove is None:
+            startTime = time.time()
+
+            def report(depth, score, move):
+                elapsed = max(time.time() - startTime, 0.001)
+                send(f"info depth {depth} score {scoreToUci(score, depth)} nodes {AI.nodesSearched} "
+                     f"nps {int(AI.nodesSearched / elapsed)} time {int(elapsed * 1000)} pv {moveToUci(move)}")
+            results = AI.iterativeDeepening(gs, validMoves, timeLimit, depthLimit, report)
+            bestMove = results[-1][2] if results and results[-1][2] is not None else AI.findRandomMove(validMoves)
+        ponderMove = None
+        ponderMoveID = AI.expectedReply(gs, bestMove)
+        if ponderMoveID is not None:
+            gs.makeMove(bestMove)
+            ponderMove = gs.getMoveFromID(ponderMoveID)
+            gs.undoMove()
+        if infinite:  # UCI only allows bestmove once the GUI has said stop
+            self.stopEvent.wait()
+        send("bestmove " + moveToUci(bestMove) + (" ponder " + moveToUci(ponderMove) if ponderMove else ""))
+
+
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stopSearch()
+
+
+if __name__ == "__main__":
+    main()